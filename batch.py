@@ -0,0 +1,169 @@
+"""
+Group Name: CAS/DAN GROUP-15
+Group Members:
+- S388343 Princy Patel
+- S390060 Lamia Sarwar 
+- S389242 Mahesh Chandra Regmi
+- S390909 Gallage Achintha Methsara Fernando
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+import cv2
+
+from image_processing import (
+    BrightnessProcessor,
+    ContrastProcessor,
+    CropProcessor,
+    GammaProcessor,
+    GrayscaleProcessor,
+    IMAGE_EXTENSIONS,
+    InvertProcessor,
+    RenderPlan,
+    RotateProcessor,
+    ThresholdProcessor,
+)
+
+# Pipeline steps taking one number, with the value used when it is left out
+POINT_STEPS = {
+    "brightness": (BrightnessProcessor, None),
+    "contrast": (ContrastProcessor, None),
+    "gamma": (GammaProcessor, None),
+    "threshold": (ThresholdProcessor, 128),
+}
+
+def parse_pipeline(spec):
+    """Turn "grayscale,rotate,crop=x1:y1:x2:y2,brightness=20" into a list of processors.
+
+    Crop coordinates are in pixels of the image as it is at that step of the chain.
+    Point operations (brightness, contrast, gamma, invert, threshold) next to each other
+    are fused into one lookup table when the chain is rendered.
+    """
+    processors = []
+    for step in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, arguments = step.partition("=")
+        if name == "grayscale":
+            processors.append(GrayscaleProcessor())
+        elif name == "rotate":
+            turns = int(arguments) if arguments else 1
+            processors.extend(RotateProcessor() for _ in range(turns % 4))
+        elif name == "crop":
+            try:
+                x1, y1, x2, y2 = (int(value) for value in arguments.split(":"))
+            except ValueError:
+                raise ValueError(f"crop expects x1:y1:x2:y2, got {arguments!r}")
+            processors.append(CropProcessor(x1, y1, x2, y2, 1.0))
+        elif name in POINT_STEPS:
+            cls, default = POINT_STEPS[name]
+            try:
+                value = float(arguments) if arguments else default
+            except ValueError:
+                raise ValueError(f"{name} expects a number, got {arguments!r}")
+            if value is None:
+                raise ValueError(f"{name} expects a value, e.g. {name}=1.2")
+            processors.append(cls(value))
+        elif name == "invert":
+            processors.append(InvertProcessor())
+        else:
+            raise ValueError(f"Unknown pipeline step: {name!r}")
+    return processors
+
+def find_images(input_dir, recursive=False):
+    for entry in os.scandir(input_dir):
+        if entry.is_dir() and recursive:
+            yield from find_images(entry.path, recursive)
+        elif entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            yield entry.path
+
+def output_path_for(input_path, input_dir, output_dir, extension=None):
+    relative = os.path.relpath(input_path, input_dir)
+    if extension:
+        relative = os.path.splitext(relative)[0] + "." + extension.lstrip(".")
+    return os.path.join(output_dir, relative)
+
+def process_file(input_path, output_path, processors):
+    """Run one image through the chain. Executed inside a pool worker."""
+    start = time.perf_counter()
+    try:
+        image = cv2.imread(input_path)
+        if image is None:
+            raise Exception("Failed to load image")
+        image = RenderPlan.from_processors(image, processors).render(image)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        if not cv2.imwrite(output_path, image):
+            raise Exception(f"Could not write {output_path}")
+        error = None
+    except Exception as e:
+        error = str(e)
+    return input_path, time.perf_counter() - start, error
+
+def _init_worker():
+    # One OpenCV thread per process; the pool already provides the parallelism
+    cv2.setNumThreads(1)
+
+def run_batch(input_dir, output_dir, processors, workers=None, max_in_flight=None,
+              extension=None, recursive=False, report=print):
+    """Stream every image under input_dir through the pool and return a summary dict.
+
+    At most max_in_flight files are queued or being processed at once, so memory use is
+    bounded regardless of how many files the directory holds.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    pending = deque()
+    processed = failed = 0
+    start = time.perf_counter()
+
+    def collect(result):
+        nonlocal processed, failed
+        input_path, elapsed, error = result.get()
+        processed += 1
+        if error:
+            failed += 1
+            report(f"FAILED  {input_path}: {error}")
+        else:
+            report(f"{elapsed * 1000:9.1f} ms  {input_path}")
+
+    with multiprocessing.Pool(processes=workers, initializer=_init_worker) as pool:
+        for input_path in find_images(input_dir, recursive):
+            if len(pending) >= max_in_flight:
+                collect(pending.popleft())
+            output_path = output_path_for(input_path, input_dir, output_dir, extension)
+            pending.append(pool.apply_async(process_file, (input_path, output_path, processors)))
+        while pending:
+            collect(pending.popleft())
+
+    total = time.perf_counter() - start
+    throughput = processed / total if total > 0 else 0.0
+    report(f"{processed} images ({failed} failed) in {total:.2f} s: {throughput:.2f} images/sec")
+    return {"processed": processed, "failed": failed, "seconds": total, "images_per_second": throughput}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply an image editor pipeline to every image in a directory.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--pipeline", required=True,
+                        help='comma separated steps, e.g. "grayscale,rotate=2,crop=0:0:640:480,contrast=1.2"')
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="images queued or processing at once (default: 2 x workers)")
+    parser.add_argument("--format", dest="extension", default=None, help="output extension, e.g. png or jpg")
+    parser.add_argument("--recursive", action="store_true", help="include subdirectories")
+    args = parser.parse_args(argv)
+
+    try:
+        processors = parse_pipeline(args.pipeline)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = run_batch(args.input_dir, args.output_dir, processors, args.workers,
+                        args.max_in_flight, args.extension, args.recursive)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+Group Name: CAS/DAN GROUP-15
+Group Members:
+- S388343 Princy Patel
+- S390060 Lamia Sarwar 
+- S389242 Mahesh Chandra Regmi
+- S390909 Gallage Achintha Methsara Fernando
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from image_processing import (
+    BrightnessProcessor,
+    ContrastProcessor,
+    CropProcessor,
+    EditHistory,
+    GammaProcessor,
+    GrayscaleProcessor,
+    ImageSource,
+    InvertProcessor,
+    PreviewPyramid,
+    RenderPlan,
+    RotateProcessor,
+    ThresholdProcessor,
+    TileExecutor,
+    load_image,
+    render_preview,
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_SIZES = (1, 10, 25, 50, 100)
+DEFAULT_THRESHOLD = 0.10
+
+# Preview sizes the editor asks for across the zoom slider range on its 350x350 canvas
+PREVIEW_SIZES = (88, 175, 262, 350, 437)
+
+def synthetic_image(megapixels, seed=0):
+    """A smooth 4:3 BGR test image, so encoders see realistic rather than noise-like content."""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(megapixels * 1_000_000 / width)
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(0, 8, (height, width, 1), dtype=np.uint8)
+    return cv2.add(image, np.broadcast_to(noise, image.shape).copy())
+
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def bench_processor(processor):
+    def run(image, repeat, workdir):
+        return {"timings": _time(lambda: processor.process(image), repeat)}
+    return run
+
+POINT_CHAIN = [BrightnessProcessor(10), ContrastProcessor(1.2), GammaProcessor(0.9),
+               InvertProcessor(), ThresholdProcessor(100)]
+
+def bench_point_chain_fused(image, repeat, workdir):
+    plan = RenderPlan.from_processors(image, POINT_CHAIN)
+    return {"timings": _time(lambda: plan.render(image), repeat)}
+
+def bench_point_chain_separate(image, repeat, workdir):
+    # One full-frame pass and temporary array per operation, as chained process() calls do
+    def run():
+        result = image
+        for processor in POINT_CHAIN:
+            result = processor.process(result)
+    return {"timings": _time(run, repeat)}
+
+def bench_pyramid(image, repeat, workdir):
+    return {"timings": _time(lambda: PreviewPyramid(image), repeat)}
+
+def bench_preview(image, repeat, workdir):
+    pyramid = PreviewPyramid(image)
+    plan = RenderPlan.from_processors(image, [RotateProcessor(), GrayscaleProcessor()])
+
+    def redraw():
+        for size in PREVIEW_SIZES:
+            render_preview(pyramid, plan, size, size * 3 // 4)
+
+    timings = _time(redraw, repeat)
+    return {"timings": [t / len(PREVIEW_SIZES) for t in timings]}
+
+def bench_preview_full_resize(image, repeat, workdir):
+    # The pre-pyramid preview path: resize the full-resolution array on every redraw
+    def redraw():
+        for size in PREVIEW_SIZES:
+            cv2.resize(image, (size, size * 3 // 4), interpolation=cv2.INTER_AREA)
+
+    timings = _time(redraw, repeat)
+    return {"timings": [t / len(PREVIEW_SIZES) for t in timings]}
+
+def bench_save(extension):
+    def run(image, repeat, workdir):
+        path = os.path.join(workdir, "save." + extension)
+        timings = _time(lambda: cv2.imwrite(path, image), repeat)
+        return {"timings": timings, "file_bytes": os.path.getsize(path)}
+    return run
+
+def bench_open_preview(image, repeat, workdir):
+    path = os.path.join(workdir, "load.jpg")
+    cv2.imwrite(path, image)
+    return {"timings": _time(lambda: ImageSource.open(path), repeat)}
+
+def bench_load_full(image, repeat, workdir):
+    path = os.path.join(workdir, "load.jpg")
+    cv2.imwrite(path, image)
+    return {"timings": _time(lambda: load_image(path), repeat)}
+
+def bench_history(image, repeat, workdir):
+    """Memory after each of 20 materialized edits, then the cost of undoing and redoing them all."""
+    height, width = image.shape[:2]
+    operations = [RotateProcessor(), GrayscaleProcessor(),
+                  CropProcessor(width // 20, height // 20, width - width // 20, height - height // 20, 1.0)]
+    history = EditHistory(ImageSource.from_array(image))
+    memory = []
+    for i in range(20):
+        history.apply(operations[i % len(operations)])
+        history.materialize()
+        memory.append(history.memory_usage())
+
+    def undo_redo():
+        while history.can_undo():
+            history.undo()
+            history.materialize()
+        while history.can_redo():
+            history.redo()
+            history.materialize()
+
+    return {"timings": _time(undo_redo, repeat), "history_bytes": memory}
+
+CASES = {
+    "grayscale": bench_processor(GrayscaleProcessor()),
+    "rotate": bench_processor(RotateProcessor()),
+    "crop": bench_processor(CropProcessor(100, 100, 900, 700, 1.0)),
+    "point_chain_fused": bench_point_chain_fused,
+    "point_chain_separate": bench_point_chain_separate,
+    "pyramid_build": bench_pyramid,
+    "preview_render": bench_preview,
+    "preview_full_resize": bench_preview_full_resize,
+    "open_preview": bench_open_preview,
+    "load_full": bench_load_full,
+    "save_png": bench_save("png"),
+    "save_jpg": bench_save("jpg"),
+    "history": bench_history,
+}
+
+# Plan used to measure how full-resolution rendering scales with TileExecutor workers
+SCALING_CHAIN = [RotateProcessor(), GrayscaleProcessor(), ContrastProcessor(1.2), GammaProcessor(0.9)]
+
+def worker_counts(maximum=None):
+    """1, 2, 4, ... up to the number of cores, always ending with the core count itself."""
+    maximum = maximum or os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < maximum:
+        counts.append(workers)
+        workers *= 2
+    return counts + [maximum]
+
+def run_scaling_case(megapixels, workers, repeat):
+    image = synthetic_image(megapixels)
+    plan = RenderPlan.from_processors(image, SCALING_CHAIN)
+    executor = TileExecutor(workers=workers, min_parallel_bytes=0)
+    try:
+        # The first render starts the pool threads, which should not count against the timings
+        executor.render(plan, image)
+        timings = _time(lambda: executor.render(plan, image), repeat)
+    finally:
+        executor.shutdown()
+    return {
+        "case": f"tile_render_{workers}_workers",
+        "megapixels": megapixels,
+        "workers": workers,
+        "shape": list(image.shape),
+        "best_seconds": min(timings),
+        "mean_seconds": sum(timings) / len(timings),
+        "peak_rss_bytes": peak_rss(),
+    }
+
+def run_scaling(sizes, repeat, counts, report=print):
+    """Time a full-resolution render at each worker count and its speedup over one worker."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for megapixels in sizes:
+        single = None
+        for workers in counts:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_scaling_case, (megapixels, workers, repeat))
+            if workers == 1:
+                single = result["best_seconds"]
+            if single:
+                result["speedup"] = single / result["best_seconds"]
+            results.append(result)
+            report(f"tile_render {megapixels:6g} MP  {workers:3d} workers  {result['best_seconds'] * 1000:10.2f} ms"
+                   + (f"  {result['speedup']:5.2f}x" if single else ""))
+    return {"meta": _meta(repeat), "results": results}
+
+def run_case(name, megapixels, repeat):
+    """Run one case on a fresh image. Executed in a child process so peak RSS is per case."""
+    image = synthetic_image(megapixels)
+    rss_before = peak_rss()
+    with tempfile.TemporaryDirectory(prefix="editor-bench-") as workdir:
+        result = CASES[name](image, repeat, workdir)
+    timings = result.pop("timings")
+    return {
+        "case": name,
+        "megapixels": megapixels,
+        "shape": list(image.shape),
+        "best_seconds": min(timings),
+        "mean_seconds": sum(timings) / len(timings),
+        "rss_after_setup_bytes": rss_before,
+        "peak_rss_bytes": peak_rss(),
+        **result,
+    }
+
+def run_suite(cases, sizes, repeat, report=print):
+    # A fresh spawned process per case keeps one case's allocations out of the next one's peak RSS
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for megapixels in sizes:
+        for name in cases:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_case, (name, megapixels, repeat))
+            results.append(result)
+            rss = result["peak_rss_bytes"]
+            report(f"{name:20s} {megapixels:6g} MP  {result['best_seconds'] * 1000:10.2f} ms"
+                   + (f"  peak RSS {rss / 1024 ** 2:8.1f} MB" if rss else ""))
+    return {"meta": _meta(repeat), "results": results}
+
+def _meta(repeat):
+    return {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, report=print):
+    """Return the regressions of current against baseline, matching cases by name and size."""
+    previous = {(r["case"], r["megapixels"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get((result["case"], result["megapixels"]))
+        if before is None:
+            continue
+        for metric in ("best_seconds", "peak_rss_bytes"):
+            old, new = before.get(metric), result.get(metric)
+            if not old or not new:
+                continue
+            change = new / old - 1
+            flag = "REGRESSION" if change > threshold else ""
+            report(f"{result['case']:20s} {result['megapixels']:6g} MP  {metric:15s} {change:+8.1%}  {flag}")
+            if flag:
+                regressions.append({"case": result["case"], "megapixels": result["megapixels"],
+                                    "metric": metric, "baseline": old, "current": new, "change": change})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the image editor processors and preview path.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=list(DEFAULT_SIZES), help="image sizes in megapixels")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scaling", action="store_true",
+                        help="instead of the cases, time tiled rendering at 1, 2, 4, ... worker threads")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="worker counts for --scaling (default: powers of two up to the core count)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored results file")
+    parser.add_argument("--current", metavar="RESULTS", help="compare this results file instead of running the suite")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown or RSS growth counted as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.current:
+        with open(args.current) as f:
+            results = json.load(f)
+    else:
+        if args.scaling:
+            results = run_scaling(args.sizes, args.repeat, args.workers or worker_counts())
+        else:
+            results = run_suite(args.cases, args.sizes, args.repeat)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,36 +13,217 @@ from tkinter import filedialog, ttk, messagebox
 import cv2
 from PIL import ImageTk, Image
 import numpy as np
-from abc import ABC, abstractmethod
-
-class ImageProcessor(ABC):
-    @abstractmethod
-    def process(self, image):
-        pass
-
-class GrayscaleProcessor(ImageProcessor):
-    def process(self, image):
-        gray_image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        return cv2.cvtColor(gray_image, cv2.COLOR_GRAY2RGB)
-
-class RotateProcessor(ImageProcessor):
-    def process(self, image):
-        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
-
-class CropProcessor(ImageProcessor):
-    def __init__(self, x1, y1, x2, y2, ratio):
-        self.x1 = x1
-        self.y1 = y1
-        self.x2 = x2
-        self.y2 = y2
-        self.ratio = ratio
-
-    def process(self, image):
-        x1_image = int(self.x1 * self.ratio)
-        y1_image = int(self.y1 * self.ratio)
-        x2_image = int(self.x2 * self.ratio)
-        y2_image = int(self.y2 * self.ratio)
-        return image[y1_image:y2_image, x1_image:x2_image]
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from image_processing import (
+    BrightnessProcessor,
+    ContrastProcessor,
+    CropProcessor,
+    EditHistory,
+    GammaProcessor,
+    GrayscaleProcessor,
+    ImageSource,
+    InvertProcessor,
+    PreviewPyramid,
+    RenderPlan,
+    ResultCache,
+    RotateProcessor,
+    THUMBNAIL_SIZE,
+    ThresholdProcessor,
+    ThumbnailIndex,
+    TileExecutor,
+    VIEWPORT_CACHE_BUDGET,
+    Viewport,
+    Workspace,
+    generate_thumbnails,
+    load_session,
+    render_preview,
+    render_region,
+    save_session,
+)
+from instrumentation import Tracer, describe_array, format_span
+
+RENDER_INTERVAL_MS = 16
+TRACE_READOUT_INTERVAL_MS = 250
+THUMBNAIL_POLL_INTERVAL_MS = 200
+
+# One wheel notch or zoom shortcut multiplies the zoom by ZOOM_STEP
+ZOOM_STEP = 1.25
+ZOOM_SLIDER_RANGE = (1, 1600)
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class BackgroundWorker:
+    """Runs jobs on a thread pool and hands results back on the Tk thread via root.after polling.
+
+    Jobs are grouped into channels ("load", "save", ...). Submitting to a busy channel
+    supersedes the previous job: it is cancelled if it has not started yet, and its result
+    is discarded if it has.
+    """
+
+    POLL_INTERVAL_MS = 30
+
+    def __init__(self, root, max_workers=2, on_busy_changed=None):
+        self.root = root
+        self.on_busy_changed = on_busy_changed
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="editor-worker")
+        self._jobs = {}
+        self._poll_id = None
+
+    def submit(self, channel, description, func, on_success, on_error=None):
+        self.cancel(channel)
+        future = self._executor.submit(func)
+        self._jobs[channel] = (future, description, on_success, on_error)
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.POLL_INTERVAL_MS, self._poll)
+        self._notify()
+
+    def cancel(self, channel):
+        job = self._jobs.pop(channel, None)
+        if job is not None:
+            job[0].cancel()
+            self._notify()
+
+    def is_busy(self, channel=None):
+        return channel in self._jobs if channel is not None else bool(self._jobs)
+
+    def descriptions(self):
+        return [job[1] for job in self._jobs.values()]
+
+    def shutdown(self):
+        for channel in list(self._jobs):
+            self.cancel(channel)
+        self._executor.shutdown(wait=False)
+
+    def _poll(self):
+        self._poll_id = None
+        finished = [channel for channel, job in self._jobs.items() if job[0].done()]
+        for channel in finished:
+            future, _, on_success, on_error = self._jobs.pop(channel)
+            try:
+                result = future.result()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+            else:
+                on_success(result)
+        if self._jobs:
+            self._poll_id = self.root.after(self.POLL_INTERVAL_MS, self._poll)
+        if finished:
+            self._notify()
+
+    def _notify(self):
+        if self.on_busy_changed is not None:
+            self.on_busy_changed()
+
+def _shorten(name, length=16):
+    return name if len(name) <= length else name[:length // 2 - 1] + "..." + name[-(length // 2 - 2):]
+
+class Filmstrip:
+    """A horizontal strip of a folder's thumbnails.
+
+    Only the cells scrolled into view have canvas items, so a folder of thousands of
+    images costs no more to show than a handful. Thumbnails are read from the index as
+    cells come into view, and refresh() fills in the ones that have arrived since.
+    """
+
+    PADDING = 6
+    LABEL_HEIGHT = 16
+
+    def __init__(self, parent, on_select):
+        self.on_select = on_select
+        self.index = None
+        self.selected = None
+        self._cells = {}
+        self._cell_size = THUMBNAIL_SIZE + 2 * self.PADDING
+
+        self.frame = Frame(parent)
+        self.canvas = Canvas(self.frame, height=self._cell_size + self.LABEL_HEIGHT, bg="gray25", highlightthickness=0)
+        self.scrollbar = Scrollbar(self.frame, orient=HORIZONTAL, command=self._on_scrollbar)
+        self.canvas.config(xscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side=TOP, fill=X)
+        self.scrollbar.pack(side=TOP, fill=X)
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind("<ButtonPress-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-4>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-5>", self._on_mouse_wheel)
+
+    def show(self, index):
+        self.canvas.delete("all")
+        self._cells.clear()
+        self.index = index
+        self.canvas.config(scrollregion=(0, 0, len(index) * self._cell_size, self._cell_size + self.LABEL_HEIGHT))
+        self.canvas.xview_moveto(0)
+        self.refresh()
+
+    def select(self, path):
+        self.selected = os.path.abspath(path) if path else None
+        for position, cell in self._cells.items():
+            self.canvas.itemconfig(cell["frame"], outline=self._outline(position))
+
+    def refresh(self):
+        """Create the cells now in view, fill in thumbnails that have arrived and drop the rest."""
+        if self.index is None:
+            return
+        left = self.canvas.canvasx(0)
+        first = max(0, int(left // self._cell_size))
+        last = min(len(self.index), int((left + self.canvas.winfo_width()) // self._cell_size) + 1)
+        visible = range(first, last)
+
+        for position in [position for position in self._cells if position not in visible]:
+            for item in ("frame", "image", "label"):
+                self.canvas.delete(self._cells[position][item])
+            del self._cells[position]
+
+        for position in visible:
+            cell = self._cells.get(position)
+            if cell is None:
+                cell = self._cells[position] = self._create_cell(position)
+            if cell["photo"] is None:
+                thumbnail = self.index.get(self.index.paths[position])
+                if thumbnail is not None:
+                    rgb = cv2.cvtColor(np.ascontiguousarray(thumbnail), cv2.COLOR_BGR2RGB)
+                    cell["photo"] = ImageTk.PhotoImage(image=Image.fromarray(rgb))
+                    self.canvas.itemconfig(cell["image"], image=cell["photo"])
+
+    def _create_cell(self, position):
+        size = self._cell_size
+        x = position * size
+        return {
+            "frame": self.canvas.create_rectangle(x + 2, 2, x + size - 2, size - 2,
+                                                  outline=self._outline(position), width=2),
+            "image": self.canvas.create_image(x + size // 2, size // 2),
+            "label": self.canvas.create_text(x + size // 2, size + self.LABEL_HEIGHT // 2, fill="white",
+                                             text=_shorten(os.path.basename(self.index.paths[position]))),
+            "photo": None,
+        }
+
+    def _outline(self, position):
+        return "orange" if self.index.paths[position] == self.selected else "gray40"
+
+    def _on_scrollbar(self, *args):
+        self.canvas.xview(*args)
+        self.refresh()
+
+    def _on_mouse_wheel(self, event):
+        backwards = event.num == 4 or (event.num != 5 and event.delta > 0)
+        self.canvas.xview_scroll(-3 if backwards else 3, "units")
+        self.refresh()
+
+    def _on_click(self, event):
+        if self.index is None:
+            return
+        position = int(self.canvas.canvasx(event.x) // self._cell_size)
+        if 0 <= position < len(self.index):
+            self.on_select(self.index.paths[position])
 
 class ImageEditor:
     def __init__(self, root):
@@ -50,25 +231,94 @@ class ImageEditor:
         self.root.title("Python Image Editor - CAS/DAN Group = 15")
         self.root.geometry("1000x800")
         
-        self._original_image = None
-        self._modified_image = None
+        self._workspace = Workspace()
+        self._document = None
+        self._source = None
         self._filename = None
-        self._undo_stack = []
-        self._redo_stack = []
+        self._history = None
         self._crop_mode = False
         self._crop_start_x = None
         self._crop_start_y = None
         self._crop_id = None
-        self._preview_dimensions = None
-        self._ratio = 1.0
+        self._viewport = Viewport(350, 350)
+        self._tiles = {}
+        self._pan_start = None
+        self._pyramid = None
+        self._render_id = None
+        self._dirty_canvases = set()
+        self._rendered_keys = {}
+        self._photo_images = {}
+        self._canvas_items = {}
+        self._tracer = Tracer()
+        self._result_cache = ResultCache()
+        self._tile_cache = ResultCache(VIEWPORT_CACHE_BUDGET)
+        self._executor = TileExecutor()
+        self._last_traced = None
+        self._thumbnail_stop = None
+        # Thumbnail generation can hold one worker for a long time; loads and saves use the others
+        self._worker = BackgroundWorker(self.root, max_workers=3, on_busy_changed=self._update_status)
 
         self._create_gui()
         self._bind_shortcuts()
+        self._refresh_trace_readout()
 
     def _create_gui(self):
+        self._create_menu()
         self._create_canvas_frame()
         self._create_button_frame()
         self._create_instructions_frame()
+        self._create_filmstrip()
+        self._create_status_bar()
+
+    def _create_menu(self):
+        self.menu_bar = Menu(self.root)
+        file_menu = Menu(self.menu_bar, tearoff=0)
+        file_menu.add_command(label="Open Image...", accelerator="Ctrl+O", command=self.select_image)
+        file_menu.add_command(label="Open Folder...", accelerator="Ctrl+F", command=self.open_folder)
+        file_menu.add_command(label="Save Image...", accelerator="Ctrl+S", command=self.save_image)
+        file_menu.add_command(label="Close Image", accelerator="Ctrl+W", command=self.close_image)
+        file_menu.add_separator()
+        file_menu.add_command(label="Open Session...", accelerator="Ctrl+Shift+O", command=self.open_session)
+        file_menu.add_command(label="Save Session...", accelerator="Ctrl+Shift+S", command=self.save_session)
+        file_menu.add_separator()
+        file_menu.add_command(label="Export Trace...", accelerator="Ctrl+T", command=self.export_trace)
+        self.menu_bar.add_cascade(label="File", menu=file_menu)
+
+        adjust_menu = Menu(self.menu_bar, tearoff=0)
+        adjust_menu.add_command(label="Brighten", command=lambda: self.adjust(BrightnessProcessor(20)))
+        adjust_menu.add_command(label="Darken", command=lambda: self.adjust(BrightnessProcessor(-20)))
+        adjust_menu.add_command(label="More Contrast", command=lambda: self.adjust(ContrastProcessor(1.25)))
+        adjust_menu.add_command(label="Less Contrast", command=lambda: self.adjust(ContrastProcessor(0.8)))
+        adjust_menu.add_command(label="Lighten Midtones", command=lambda: self.adjust(GammaProcessor(1.25)))
+        adjust_menu.add_command(label="Darken Midtones", command=lambda: self.adjust(GammaProcessor(0.8)))
+        adjust_menu.add_separator()
+        adjust_menu.add_command(label="Invert", command=lambda: self.adjust(InvertProcessor()))
+        adjust_menu.add_command(label="Threshold", command=lambda: self.adjust(ThresholdProcessor()))
+        self.menu_bar.add_cascade(label="Adjust", menu=adjust_menu)
+
+        view_menu = Menu(self.menu_bar, tearoff=0)
+        view_menu.add_command(label="Zoom In", accelerator="Ctrl++", command=lambda: self.zoom_by(ZOOM_STEP))
+        view_menu.add_command(label="Zoom Out", accelerator="Ctrl+-", command=lambda: self.zoom_by(1 / ZOOM_STEP))
+        view_menu.add_command(label="Fit to Window", accelerator="Ctrl+0", command=self.zoom_fit)
+        view_menu.add_command(label="Actual Pixels", accelerator="Ctrl+1", command=lambda: self.zoom_to(1.0))
+        self.menu_bar.add_cascade(label="View", menu=view_menu)
+
+        self._document_var = StringVar(self.root)
+        self.images_menu = Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Images", menu=self.images_menu)
+        self._refresh_images_menu()
+        self.root.config(menu=self.menu_bar)
+
+    def _refresh_images_menu(self):
+        self.images_menu.delete(0, END)
+        self.images_menu.add_command(label="Next Image", accelerator="Ctrl+Tab", command=self.next_image)
+        self.images_menu.add_separator()
+        for document in self._workspace.documents():
+            self.images_menu.add_radiobutton(
+                label=document.name, value=document.path, variable=self._document_var,
+                command=lambda path=document.path: self.switch_image(path)
+            )
+        self._document_var.set(self._document.path if self._document is not None else "")
 
     def _create_canvas_frame(self):
         self.canvas_frame = Frame(self.root)
@@ -80,6 +330,15 @@ class ImageEditor:
         self.canvas_modified = Canvas(self.canvas_frame, width=350, height=350, bg="#CBC3E3")
         self.canvas_modified.pack(side=LEFT, fill=BOTH, expand=True, padx=5, pady=5)
 
+        # Dragging pans the viewport, or selects the crop area in crop mode; the wheel zooms
+        self.canvas_modified.bind("<ButtonPress-1>", self._on_button_press)
+        self.canvas_modified.bind("<B1-Motion>", self._on_mouse_move)
+        self.canvas_modified.bind("<ButtonRelease-1>", self._on_button_release)
+        self.canvas_modified.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.canvas_modified.bind("<Button-4>", self._on_mouse_wheel)
+        self.canvas_modified.bind("<Button-5>", self._on_mouse_wheel)
+        self.canvas_modified.bind("<Configure>", self._on_canvas_resize)
+
     def _create_button_frame(self):
         self.button_frame = Frame(self.root, padx=20, pady=10, bg="white")
         self.button_frame.pack(fill=X)
@@ -94,13 +353,13 @@ class ImageEditor:
         Button(self.button_frame, text="Redo", command=self.redo, **button_style).pack(side=LEFT, padx=5)
         
         self.zoom_slider = Scale(self.button_frame, 
-                               label="Zoom Image",
-                               from_=25, 
-                               to=125,
+                               label="Zoom %",
+                               from_=ZOOM_SLIDER_RANGE[0], 
+                               to=ZOOM_SLIDER_RANGE[1],
                                orient=HORIZONTAL,
                                length=300,
                                command=self.slider)
-        self.zoom_slider.set(75)
+        self.zoom_slider.set(100)
         self.zoom_slider.pack(side=LEFT, padx=10)
         
         Button(self.button_frame, text="Save Image", command=self.save_image, **button_style).pack(side=LEFT, padx=5)
@@ -110,7 +369,7 @@ class ImageEditor:
         1. Select image to edit.                                                                                                            Select Image = Control + O      Undo = Control + Z
         2. View the original image on left and make changes to right image.                                 Crop = Control + C                    Redo = Control + Y
         3. Use functionality like Crop, Grayscale, or Rotate to edit image.                                     Grayscale = Control + G            Save Image = Control + S
-        4. Use Undo/Redo, Zoom, and save your image.                                                                  Rotate = Control + R
+        4. Use Undo/Redo, Zoom (mouse wheel, drag to pan), and save.                                                  Rotate = Control + R
         5. Use keyboard shortcuts for faster operations!'''
         
         instructions = Label(self.root, 
@@ -120,119 +379,468 @@ class ImageEditor:
                            wraplength=900)
         instructions.pack(pady=10)
 
+    def _create_filmstrip(self):
+        self.filmstrip = Filmstrip(self.root, self.open_image)
+        self.filmstrip.frame.pack(fill=X, padx=10)
+
+    def _create_status_bar(self):
+        self.status_frame = Frame(self.root, relief=SUNKEN, bd=1)
+        self.status_frame.pack(side=BOTTOM, fill=X)
+
+        self.status_label = Label(self.status_frame, text="No image loaded", anchor=W, padx=10)
+        self.status_label.pack(side=LEFT, fill=X, expand=True)
+
+        self.progress_bar = ttk.Progressbar(self.status_frame, mode="indeterminate", length=120)
+        self.progress_bar.pack(side=RIGHT, padx=10)
+
+        Button(self.status_frame, text="Export Trace", command=self.export_trace).pack(side=RIGHT, padx=5)
+
+        self.trace_label = Label(self.status_frame, text="", anchor=E, padx=10, fg="gray25")
+        self.trace_label.pack(side=RIGHT)
+
+    def _refresh_trace_readout(self):
+        # Spans are recorded from worker threads too, so the label is refreshed from the Tk thread
+        event = self._tracer.last()
+        if event is not None and event is not self._last_traced:
+            self._last_traced = event
+            self.trace_label.config(text=format_span(event))
+        self.root.after(TRACE_READOUT_INTERVAL_MS, self._refresh_trace_readout)
+
+    def export_trace(self):
+        try:
+            path = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("Chrome/Perfetto trace", "*.json")]
+            )
+            if not path:
+                return
+            count = self._tracer.export_chrome_trace(path)
+            messagebox.showinfo("Success", f"{count} trace events saved to: {path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Error exporting trace: {str(e)}")
+
+    def _update_status(self):
+        busy = self._worker.is_busy()
+        if busy:
+            self.progress_bar.start(15)
+            self.root.config(cursor="watch")
+        else:
+            self.progress_bar.stop()
+            self.root.config(cursor="")
+
+        if self._history is None:
+            text = "No image loaded"
+        else:
+            width, height = self._history.plan().output_size
+            cache = self._result_cache.stats()
+            text = (f"{width}x{height}    History: {len(self._history)} edits, "
+                    f"{_format_bytes(self._history.memory_usage())} of {_format_bytes(self._history.memory_budget)}    "
+                    f"Workspace: {len(self._workspace)} images, {_format_bytes(self._workspace.memory_usage())} "
+                    f"of {_format_bytes(self._workspace.memory_budget)}    "
+                    f"Cache: {cache['hits']} hits, {cache['misses']} misses, {_format_bytes(cache['bytes'])}")
+        if busy:
+            text = f"{', '.join(self._worker.descriptions())}...    {text}"
+        self.status_label.config(text=text)
+
     def _bind_shortcuts(self):
         self.root.bind("<Control-o>", lambda event: self.select_image())
+        self.root.bind("<Control-f>", lambda event: self.open_folder())
         self.root.bind("<Control-c>", lambda event: self.crop())
         self.root.bind("<Control-g>", lambda event: self.grayscale())
         self.root.bind("<Control-r>", lambda event: self.rotate())
         self.root.bind("<Control-z>", lambda event: self.undo())
         self.root.bind("<Control-y>", lambda event: self.redo())
         self.root.bind("<Control-s>", lambda event: self.save_image())
+        self.root.bind("<Control-t>", lambda event: self.export_trace())
+        self.root.bind("<Control-O>", lambda event: self.open_session())
+        self.root.bind("<Control-S>", lambda event: self.save_session())
+        self.root.bind("<Control-w>", lambda event: self.close_image())
+        self.root.bind("<Control-Tab>", lambda event: self.next_image())
+        self.root.bind("<Control-plus>", lambda event: self.zoom_by(ZOOM_STEP))
+        self.root.bind("<Control-equal>", lambda event: self.zoom_by(ZOOM_STEP))
+        self.root.bind("<Control-minus>", lambda event: self.zoom_by(1 / ZOOM_STEP))
+        self.root.bind("<Control-0>", lambda event: self.zoom_fit())
+        self.root.bind("<Control-1>", lambda event: self.zoom_to(1.0))
 
     def select_image(self):
+        filename = filedialog.askopenfilename(
+            filetypes=[("Image Files", "*.png *.jpg *.jpeg *.npy")]
+        )
+        if not filename:
+            return
+        self.open_image(filename)
+
+    def open_image(self, filename):
+        if filename in self._workspace:
+            # Already open: switch to it instead of decoding the file again
+            self.switch_image(filename)
+            return
+
+        def load():
+            with self._tracer.span("load.decode_preview", path=filename) as details:
+                source = ImageSource.open(filename)
+                details.update(describe_array(source.preview), full_size=[source.width, source.height])
+            with self._tracer.span("load.pyramid", **describe_array(source.preview)):
+                pyramid = PreviewPyramid(source.preview)
+            return source, pyramid
+
+        # Editor state is only swapped in on the Tk thread once the decode has finished
+        self._worker.submit(
+            "load", "Loading image", load,
+            lambda result: self._on_image_loaded(filename, *result),
+            lambda e: messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+        )
+
+    def open_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+
+        # Thumbnails still being made for the previous folder are no longer wanted
+        if self._thumbnail_stop is not None:
+            self._thumbnail_stop.set()
+        stop = self._thumbnail_stop = threading.Event()
+
+        def scan():
+            with self._tracer.span("folder.index", path=folder) as details:
+                index = ThumbnailIndex(folder)
+                details.update(images=len(index))
+            return index
+
+        self._worker.submit(
+            "folder", "Reading folder", scan,
+            lambda index: self._on_folder_indexed(index, stop),
+            lambda e: messagebox.showerror("Error", f"Failed to open folder: {str(e)}")
+        )
+
+    def _on_folder_indexed(self, index, stop):
+        self.filmstrip.show(index)
+        self.filmstrip.select(self._filename)
+        missing = index.missing()
+        if not missing:
+            return
+
+        def generate():
+            with self._tracer.span("folder.thumbnails", path=index.folder, images=len(missing)) as details:
+                details.update(made=generate_thumbnails(index, missing, stop=stop))
+
+        self._worker.submit(
+            "thumbnails", f"Creating {len(missing)} thumbnails", generate,
+            lambda result: self.filmstrip.refresh(),
+            lambda e: messagebox.showerror("Error", f"Failed to create thumbnails: {str(e)}")
+        )
+        self._poll_thumbnails()
+
+    def _poll_thumbnails(self):
+        # Thumbnails land from the pool threads; cells in view are filled in as they arrive
+        self.filmstrip.refresh()
+        if self._worker.is_busy("thumbnails"):
+            self.root.after(THUMBNAIL_POLL_INTERVAL_MS, self._poll_thumbnails)
+
+    def _on_image_loaded(self, filename, source, pyramid):
+        self._add_document(filename, EditHistory(source, cache=self._result_cache, executor=self._executor), pyramid)
+
+    def _add_document(self, filename, history, pyramid):
+        self._show_document(self._workspace.add(filename, history, pyramid))
+        self._refresh_images_menu()
+
+    def switch_image(self, path):
         try:
-            self._filename = filedialog.askopenfilename(
-                filetypes=[("Image Files", "*.png *.jpg *.jpeg")]
+            self._show_document(self._workspace.view(path))
+        except Exception as e:
+            messagebox.showerror("Error", f"Error switching image: {str(e)}")
+
+    def next_image(self):
+        documents = self._workspace.documents()
+        if len(documents) < 2 or self._document is None:
+            return
+        index = documents.index(self._document)
+        self.switch_image(documents[(index + 1) % len(documents)].path)
+
+    def close_image(self):
+        if self._document is None:
+            return
+        self._workspace.close(self._document.path)
+        document = self._workspace.most_recent()
+        if document is not None:
+            self._show_document(self._workspace.view(document.path))
+        else:
+            self._clear_document()
+        self._refresh_images_menu()
+
+    def _clear_document(self):
+        self._worker.cancel("decode")
+        self._document = None
+        self._filename = None
+        self._source = None
+        self._history = None
+        self._pyramid = None
+        self._rendered_keys.clear()
+        for canvas, item in self._canvas_items.items():
+            canvas.delete(item)
+        self._canvas_items.clear()
+        self._photo_images.clear()
+        for tile in self._tiles.values():
+            self.canvas_modified.delete(tile[0])
+        self._tiles = {}
+        self.filmstrip.select(None)
+        self._update_status()
+
+    def _show_document(self, document):
+        source = document.source
+        self._document = document
+        self._filename = document.path
+        self._source = source
+        self._history = document.history
+        self._pyramid = document.pyramid
+        self._rendered_keys.clear()
+        self._document_var.set(document.path)
+        self.filmstrip.select(source.path or document.path)
+        self._viewport.set_image_size(*document.history.plan().output_size)
+        self._viewport.fit()
+        self._sync_zoom_slider()
+
+        self.display_image()
+        self._update_status()
+
+        # The preview came from a reduced decode; fetch full resolution before it is needed
+        if not source.is_loaded:
+            filename = document.path
+
+            def decode():
+                with self._tracer.span("load.decode_full", path=filename) as details:
+                    details.update(describe_array(source.load()))
+
+            self._worker.submit(
+                "decode", "Decoding full resolution", decode,
+                lambda image: self._on_full_resolution_loaded(),
+                lambda e: messagebox.showerror("Error", f"Failed to load image: {str(e)}")
             )
-            if not self._filename:
-                return
+        else:
+            self._trim_workspace()
 
-            self._original_image = cv2.imread(self._filename)
-            if self._original_image is None:
-                raise Exception("Failed to load image")
+    def _on_full_resolution_loaded(self):
+        # Zoomed-in tiles so far were upscaled from the preview; redraw them sharp
+        self._request_render(self.canvas_modified)
+        self._trim_workspace()
 
-            self._original_image = cv2.cvtColor(self._original_image, cv2.COLOR_BGR2RGB)
-            self._original_image = self._original_image.astype('uint8')
+    def _trim_workspace(self):
+        # Spilling writes whole images to disk, so it runs on the worker like any other I/O
+        keep = self._filename
 
-            self._modified_image = None
-            self._undo_stack.clear()
-            self._redo_stack.clear()
+        def trim():
+            with self._tracer.span("workspace.spill") as details:
+                spilled = self._workspace.enforce_budget(keep)
+                details.update(documents=[document.name for document in spilled])
+            return spilled
 
-            self.display_image()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+        self._update_status()
+        self._worker.submit(
+            "workspace", "Freeing memory", trim,
+            lambda spilled: self._update_status(),
+            lambda e: messagebox.showerror("Error", f"Error freeing memory: {str(e)}")
+        )
 
     def display_image(self):
-        if self._original_image is None:
+        self._request_render(self.canvas_original, self.canvas_modified)
+
+    def _request_render(self, *canvases):
+        # Redraw requests are coalesced into at most one render per frame
+        self._dirty_canvases.update(canvases)
+        if self._render_id is None:
+            self._render_id = self.root.after(RENDER_INTERVAL_MS, self._render)
+
+    def _render(self):
+        self._render_id = None
+        dirty, self._dirty_canvases = self._dirty_canvases, set()
+        if self._source is None:
             return
 
         try:
-            factor = self.zoom_slider.get() / 100
-            self._display_single_image(self._original_image, self.canvas_original, factor)
-            image_to_show = self._modified_image if self._modified_image is not None else self._original_image
-            self._display_single_image(image_to_show, self.canvas_modified, factor)
+            if self.canvas_original in dirty:
+                self._display_single_image(RenderPlan(self._source.width, self._source.height), self.canvas_original)
+            if self.canvas_modified in dirty:
+                self._display_viewport(self._history.plan())
         except Exception as e:
             messagebox.showerror("Error", f"Error displaying image: {str(e)}")
 
-    def _display_single_image(self, image, canvas, factor):
-        height, width = image.shape[:2]
+    def _display_single_image(self, plan, canvas):
+        width, height = plan.output_size
         canvas_width = 350
         canvas_height = 350
 
         scale = min(canvas_width/width, canvas_height/height, 1)
-        preview_scale = scale * factor
 
-        preview_width = max(1, int(width * preview_scale))
-        preview_height = max(1, int(height * preview_scale))
+        preview_width = max(1, int(width * scale))
+        preview_height = max(1, int(height * scale))
 
-        preview_image = cv2.resize(image, (preview_width, preview_height), interpolation=cv2.INTER_AREA)
-        preview_image = preview_image.astype('uint8')
+        key = (plan.key, preview_width, preview_height)
+        if self._rendered_keys.get(canvas) == key:
+            return
+        self._rendered_keys[canvas] = key
 
-        photo_image = ImageTk.PhotoImage(image=Image.fromarray(preview_image))
+        with self._tracer.span("display.preview_resize") as details:
+            cache_key = (self._result_cache.identity(self._pyramid.image), "preview", plan.key, preview_width, preview_height)
+            preview_image = self._result_cache.get_or_compute(
+                cache_key, lambda: render_preview(self._pyramid, plan, preview_width, preview_height)
+            )
+            preview_image = preview_image.astype('uint8')
+            # Images stay in OpenCV's BGR order; only this small buffer is converted for PIL
+            if preview_image.ndim == 2:
+                preview_image = cv2.cvtColor(preview_image, cv2.COLOR_GRAY2RGB)
+            else:
+                preview_image = cv2.cvtColor(preview_image, cv2.COLOR_BGR2RGB)
+            details.update(describe_array(preview_image))
 
-        canvas.config(width=preview_width, height=preview_height)
-        canvas.delete("all")
-        canvas.create_image(preview_width // 2, preview_height // 2, image=photo_image)
+        # Reuse the PhotoImage and canvas item when the size allows, instead of recreating them
+        with self._tracer.span("display.photoimage", **describe_array(preview_image)):
+            pil_image = Image.fromarray(preview_image)
+            photo_image = self._photo_images.get(canvas)
+            if photo_image is not None and (photo_image.width(), photo_image.height()) == pil_image.size:
+                photo_image.paste(pil_image)
+            else:
+                photo_image = ImageTk.PhotoImage(image=pil_image)
+                self._photo_images[canvas] = photo_image
 
-        if canvas == self.canvas_original:
-            self.tk_original_image = photo_image
+        canvas.config(width=preview_width, height=preview_height)
+        item = self._canvas_items.get(canvas)
+        if item is None:
+            self._canvas_items[canvas] = canvas.create_image(preview_width // 2, preview_height // 2, image=photo_image)
         else:
-            self.tk_modified_image = photo_image
+            canvas.coords(item, preview_width // 2, preview_height // 2)
+            canvas.itemconfig(item, image=photo_image)
+
+    def _display_viewport(self, plan):
+        """Draw the visible part of the edited image as tiles, rendering only tiles not drawn yet."""
+        canvas = self.canvas_modified
+        viewport = self._viewport
+        if viewport.set_image_size(*plan.output_size):
+            self._sync_zoom_slider()
+        full_resolution = self._source.image
+
+        key = (plan.key, viewport.state, full_resolution is not None)
+        if self._rendered_keys.get(canvas) == key:
+            return
+        self._rendered_keys[canvas] = key
+
+        with self._tracer.span("display.viewport", zoom=viewport.zoom) as details:
+            identity = self._tile_cache.identity(self._pyramid.image)
+            tiles = {}
+            rendered = 0
+            for column, row, x, y, width, height, rect in viewport.tiles():
+                tile_id = (viewport.zoom, column, row)
+                content = (identity, plan.key, full_resolution is not None, tile_id)
+                tile = self._tiles.get(tile_id)
+                if tile is None or tile[2] != content:
+                    image = self._tile_cache.get_or_compute(
+                        content, lambda: self._render_tile(plan, rect, width, height, full_resolution)
+                    )
+                    photo_image = ImageTk.PhotoImage(image=Image.fromarray(image))
+                    if tile is None:
+                        tile = [canvas.create_image(x, y, anchor=NW, image=photo_image), photo_image, content]
+                    else:
+                        canvas.itemconfig(tile[0], image=photo_image)
+                        tile[1:] = [photo_image, content]
+                    rendered += 1
+                canvas.coords(tile[0], x, y)
+                tiles[tile_id] = tile
+
+            # Tiles that scrolled out of view or belong to another zoom level are dropped
+            for tile_id, tile in self._tiles.items():
+                if tile_id not in tiles:
+                    canvas.delete(tile[0])
+            self._tiles = tiles
+            if self._crop_id:
+                canvas.tag_raise(self._crop_id)
+            details.update(tiles=len(tiles), rendered=rendered)
+
+    def _render_tile(self, plan, rect, width, height, full_resolution):
+        image = render_region(self._pyramid, plan, rect, width, height, full_resolution).astype('uint8')
+        # Tiles are cached ready for PIL, already converted from OpenCV's BGR order
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def zoom_to(self, zoom, canvas_x=None, canvas_y=None):
+        if self._source is None:
+            return
+        self._viewport.zoom_to(zoom, canvas_x, canvas_y)
+        self._sync_zoom_slider()
+        self._request_render(self.canvas_modified)
+
+    def zoom_by(self, factor, canvas_x=None, canvas_y=None):
+        self.zoom_to(self._viewport.zoom * factor, canvas_x, canvas_y)
+
+    def zoom_fit(self):
+        if self._source is None:
+            return
+        self._viewport.fit()
+        self._sync_zoom_slider()
+        self._request_render(self.canvas_modified)
 
-        if canvas == self.canvas_modified:
-            self._preview_dimensions = (preview_width, preview_height)
-            self._ratio = width / preview_width if preview_width != 0 else 1
+    def _sync_zoom_slider(self):
+        self.zoom_slider.set(self._slider_percent())
 
-    def _save_state(self):
-        current_image = self._modified_image if self._modified_image is not None else self._original_image
-        self._undo_stack.append(current_image.copy())
-        self._redo_stack.clear()
+    def _slider_percent(self):
+        low, high = ZOOM_SLIDER_RANGE
+        return min(max(round(self._viewport.zoom * 100), low), high)
+
+    def _on_mouse_wheel(self, event):
+        # X11 reports the wheel as buttons 4 and 5; Windows and macOS send <MouseWheel> with a delta
+        zoom_in = event.num == 4 or (event.num != 5 and event.delta > 0)
+        self.zoom_by(ZOOM_STEP if zoom_in else 1 / ZOOM_STEP, event.x, event.y)
+
+    def _on_canvas_resize(self, event):
+        self._viewport.resize(event.width, event.height)
+        self._request_render(self.canvas_modified)
+
+    def _apply_processor(self, processor):
+        # Applying only records the edit; its pixels are produced by display.* and save.render
+        with self._tracer.span(f"edit.record.{type(processor).__name__}", operations=len(self._history) + 1):
+            self._history.apply(processor)
+        self._request_render(self.canvas_modified)
+        self._update_status()
 
     def grayscale(self):
         try:
-            if self._modified_image is None and self._original_image is None:
+            if self._history is None:
                 raise Exception("No image available")
 
-            self._save_state()
-            processor = GrayscaleProcessor()
-            self._modified_image = processor.process(self._modified_image if self._modified_image is not None else self._original_image)
-            self.display_image()
+            self._apply_processor(GrayscaleProcessor())
         except Exception as e:
             messagebox.showerror("Error", f"Error applying grayscale: {str(e)}")
 
     def rotate(self):
         try:
-            if self._modified_image is None and self._original_image is None:
+            if self._history is None:
                 raise Exception("No image available")
 
-            self._save_state()
-            processor = RotateProcessor()
-            self._modified_image = processor.process(self._modified_image if self._modified_image is not None else self._original_image)
-            self.display_image()
+            self._apply_processor(RotateProcessor())
         except Exception as e:
             messagebox.showerror("Error", f"Error rotating image: {str(e)}")
 
+    def adjust(self, processor):
+        try:
+            if self._history is None:
+                raise Exception("No image available")
+
+            self._apply_processor(processor)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error applying adjustment: {str(e)}")
+
     def crop(self):
-        if self._original_image is None and self._modified_image is None:
+        if self._history is None:
             messagebox.showerror("Error", "No image available to crop!")
             return
 
         self._crop_mode = True
-        self.canvas_modified.bind("<ButtonPress-1>", self._on_button_press)
-        self.canvas_modified.bind("<B1-Motion>", self._on_mouse_move)
-        self.canvas_modified.bind("<ButtonRelease-1>", self._on_button_release)
+        self.canvas_modified.config(cursor="crosshair")
 
     def _on_button_press(self, event):
+        if not self._crop_mode:
+            self._pan_start = (event.x, event.y)
+            return
+
         self._crop_start_x = event.x
         self._crop_start_y = event.y
         if self._crop_id:
@@ -241,6 +849,10 @@ class ImageEditor:
 
     def _on_mouse_move(self, event):
         if not self._crop_mode:
+            if self._pan_start is not None and self._source is not None:
+                self._viewport.pan(event.x - self._pan_start[0], event.y - self._pan_start[1])
+                self._pan_start = (event.x, event.y)
+                self._request_render(self.canvas_modified)
             return
 
         if self._crop_id is None:
@@ -258,12 +870,11 @@ class ImageEditor:
 
     def _on_button_release(self, event):
         if not self._crop_mode:
+            self._pan_start = None
             return
 
         try:
-            self.canvas_modified.unbind("<ButtonPress-1>")
-            self.canvas_modified.unbind("<B1-Motion>")
-            self.canvas_modified.unbind("<ButtonRelease-1>")
+            self.canvas_modified.config(cursor="")
             self._crop_mode = False
 
             x1, y1 = self._crop_start_x, self._crop_start_y
@@ -272,58 +883,96 @@ class ImageEditor:
             if abs(x2 - x1) < 5 or abs(y2 - y1) < 5:
                 raise Exception("Selected area is too small")
 
-            self._save_state()
-            processor = CropProcessor(x1, y1, x2, y2, self._ratio)
-            self._modified_image = processor.process(
-                self._modified_image if self._modified_image is not None else self._original_image
-            )
-
             if self._crop_id:
                 self.canvas_modified.delete(self._crop_id)
                 self._crop_id = None
 
-            self.display_image()
+            # Converted through the viewport, so the crop is exact at any zoom and pan
+            x1, y1 = self._viewport.to_image(x1, y1)
+            x2, y2 = self._viewport.to_image(x2, y2)
+            self._apply_processor(CropProcessor(round(x1), round(y1), round(x2), round(y2), 1.0))
 
         except Exception as e:
             messagebox.showerror("Error", f"Error during crop: {str(e)}")
 
     def undo(self):
         try:
-            if not self._undo_stack:
+            if self._history is None:
                 raise Exception("Nothing to undo")
 
-            if self._modified_image is not None:
-                self._redo_stack.append(self._modified_image.copy())
-            
-            self._modified_image = self._undo_stack.pop()
-            self.display_image()
+            self._history.undo()
+            self._request_render(self.canvas_modified)
+            self._update_status()
         except Exception as e:
             messagebox.showerror("Error", f"Error during undo: {str(e)}")
 
     def redo(self):
         try:
-            if not self._redo_stack:
+            if self._history is None:
                 raise Exception("Nothing to redo")
 
-            if self._modified_image is not None:
-                self._undo_stack.append(self._modified_image.copy())
-            
-            self._modified_image = self._redo_stack.pop()
-            self.display_image()
+            self._history.redo()
+            self._request_render(self.canvas_modified)
+            self._update_status()
         except Exception as e:
             messagebox.showerror("Error", f"Error during redo: {str(e)}")
 
+    def open_session(self):
+        filename = filedialog.askopenfilename(
+            filetypes=[("Editor sessions", "session.json")]
+        )
+        if not filename:
+            return
+
+        def load():
+            with self._tracer.span("session.load", path=filename):
+                history = load_session(filename, cache=self._result_cache, executor=self._executor)
+            with self._tracer.span("load.pyramid", **describe_array(history.source.preview)):
+                pyramid = PreviewPyramid(history.source.preview)
+            return history, pyramid
+
+        self._worker.submit(
+            "load", "Opening session", load,
+            lambda result: self._add_document(filename, *result),
+            lambda e: messagebox.showerror("Error", f"Failed to open session: {str(e)}")
+        )
+
+    def save_session(self):
+        try:
+            if self._history is None:
+                raise Exception("No image to save")
+
+            directory = filedialog.asksaveasfilename(
+                defaultextension=".session",
+                filetypes=[("Editor sessions", "*.session")]
+            )
+            if not directory:
+                return
+
+            history = self._history
+
+            def save():
+                with self._tracer.span("session.save", path=directory, edits=len(history)):
+                    save_session(directory, history)
+
+            self._worker.submit(
+                "save", "Saving session", save,
+                lambda result: messagebox.showinfo("Success", f"Session saved to: {directory}"),
+                lambda e: messagebox.showerror("Error", f"Error saving session: {str(e)}")
+            )
+        except Exception as e:
+            messagebox.showerror("Error", f"Error saving session: {str(e)}")
+
     def slider(self, value):
-        if self._original_image is not None:
-            self.display_image()
+        # Setting the slider to follow the wheel calls this back with the value it already shows
+        if self._source is not None and int(float(value)) != self._slider_percent():
+            self.zoom_to(int(float(value)) / 100)
 
     def save_image(self):
         try:
-            if self._modified_image is None and self._original_image is None:
+            if self._history is None:
                 raise Exception("No image to save")
 
-            image_to_save = self._modified_image if self._modified_image is not None else self._original_image
-
             save_path = filedialog.asksaveasfilename(
                 defaultextension=".png",
                 filetypes=[
@@ -336,17 +985,43 @@ class ImageEditor:
             if not save_path:
                 return
 
-            image_to_save_bgr = cv2.cvtColor(image_to_save, cv2.COLOR_RGB2BGR)
-            cv2.imwrite(save_path, image_to_save_bgr)
-            messagebox.showinfo("Success", f"Image saved to: {save_path}")
+            history = self._history
+            token, render = history.materialize_job()
+
+            def save():
+                with self._tracer.span("save.render", operations=len(token)) as details:
+                    image_to_save = render()
+                    details.update(describe_array(image_to_save))
+                with self._tracer.span("save.imwrite", path=save_path, **describe_array(image_to_save)):
+                    if not cv2.imwrite(save_path, image_to_save):
+                        raise Exception(f"Could not write {save_path}")
+                return image_to_save
+
+            def on_saved(image_to_save):
+                history.add_checkpoint(token, image_to_save)
+                self._trim_workspace()
+                messagebox.showinfo("Success", f"Image saved to: {save_path}")
+
+            self._worker.submit(
+                "save", "Saving image", save, on_saved,
+                lambda e: messagebox.showerror("Error", f"Error saving image: {str(e)}")
+            )
 
         except Exception as e:
             messagebox.showerror("Error", f"Error saving image: {str(e)}")
 
+    def shutdown(self):
+        if self._thumbnail_stop is not None:
+            self._thumbnail_stop.set()
+        self._worker.shutdown()
+        self._executor.shutdown()
+        self._workspace.clear()
+
 def main():
     root = Tk()
     app = ImageEditor(root)
     root.mainloop()
+    app.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -8,21 +8,376 @@ Group Members:
 - S390909 Gallage Achintha Methsara Fernando
 """
 
+import gc
 import pygame
 import sys
 import random
 from abc import ABC, abstractmethod
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
 
+# Side of the collision grid cells, a little larger than the biggest enemy
+COLLISION_CELL_SIZE = 128
+
+# Projectiles live for two seconds, so this covers the player's continuous fire
+PROJECTILE_POOL_SIZE = 128
+# Each enemy shoots every two seconds, so this covers a full level 5 wave
+ENEMY_PROJECTILE_POOL_SIZE = 32
+# Collectibles stay until picked up; the pool grows past this if the player leaves more
+COLLECTIBLE_POOL_SIZE = 10
+POOL_OVERFLOW_POLICIES = ('grow', 'drop', 'recycle')
+
+PLAYER_IDLE_IMAGE = 'assets/idle.png'
+PLAYER_MOVE_IMAGE = 'assets/move.png'
+PLAYER_MOVE_FRAMES = 6
+ENEMY_IMAGE = 'assets/IdleEnemy.png'
+PROJECTILE_IMAGE = 'assets/charge.png'
+BACKGROUND_IMAGE = 'assets/space.png'
+
+# The four directions sprites face, as indices into their pre-rotated variants
+RIGHT, UP, LEFT, DOWN = range(4)
+DIRECTION_ANGLES = (0, 90, 180, -90)
+
+def direction_index(dx, dy):
+    """The variant facing the dominant axis of the (dx, dy) heading."""
+    if abs(dy) > abs(dx):
+        return UP if dy < 0 else DOWN
+    return LEFT if dx < 0 else RIGHT
+
+class AssetManager:
+    """Loads, converts and scales each texture once and hands out the same surface after that.
+
+    The surfaces are shared by every sprite that uses them, so sprites must replace their
+    image rather than draw on it. Loading is lazy because convert() needs a display mode.
+    """
+
+    def __init__(self):
+        self._surfaces = {}
+
+    def _get(self, key, build):
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = self._surfaces[key] = build()
+        return surface
+
+    def image(self, path, alpha=True):
+        def load():
+            image = pygame.image.load(path)
+            return image.convert_alpha() if alpha else image.convert()
+        return self._get((path, alpha), load)
+
+    def scaled(self, path, size, alpha=True):
+        return self._get((path, alpha, size), lambda: pygame.transform.scale(self.image(path, alpha), size))
+
+    def frame(self, path, index, frames, size):
+        """One frame of a horizontal sprite sheet, scaled to size."""
+        def cut():
+            sheet = self.image(path)
+            width = sheet.get_width() // frames
+            return pygame.transform.scale(sheet.subsurface((index * width, 0, width, sheet.get_height())), size)
+        return self._get((path, index, frames, size), cut)
+
+    def directions(self, surface):
+        """The surface rotated to face RIGHT, UP, LEFT and DOWN, rendered once per surface."""
+        return self._get(('directions', surface),
+                         lambda: tuple(pygame.transform.rotate(surface, angle) for angle in DIRECTION_ANGLES))
+
+    def generated(self, name, build):
+        """A surface drawn in code rather than loaded, built on first use."""
+        return self._get(name, build)
+
+assets = AssetManager()
+
+class SpatialHash:
+    """Uniform grid of sprites bucketed by the cell holding the centre of their rect.
+
+    A rect query only tests the sprites in the cells around it, so its cost depends on
+    how crowded that area is rather than on how many sprites there are in total. Each
+    sprite sits in exactly one cell, which keeps rebuilding the grid every tick cheap;
+    queries widen by half the largest sprite inserted to find overlaps across cells.
+    """
+
+    def __init__(self, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = defaultdict(list)
+        self._reach = 0
+
+    def _key(self, rect):
+        return rect.centerx // self.cell_size, rect.centery // self.cell_size
+
+    def remove(self, sprite):
+        cell = self._cells.get(self._key(sprite.rect))
+        if cell and sprite in cell:
+            cell.remove(sprite)
+
+    def rebuild(self, sprites):
+        self._cells.clear()
+        self._reach = 0
+        size = self.cell_size
+        cells = self._cells
+        extent = 0
+        for sprite in sprites:
+            rect = sprite.rect
+            cells[rect.centerx // size, rect.centery // size].append(sprite)
+            if rect.width > extent or rect.height > extent:
+                extent = max(rect.width, rect.height)
+        self._reach = (extent + 1) // 2
+
+    def query(self, rect):
+        """Sprites whose rect collides with rect."""
+        size = self.cell_size
+        reach = self._reach
+        cells = self._cells
+        hits = []
+        for x in range((rect.left - reach) // size, (rect.right + reach) // size + 1):
+            for y in range((rect.top - reach) // size, (rect.bottom + reach) // size + 1):
+                cell = cells.get((x, y))
+                if cell:
+                    hits.extend(cell[i] for i in rect.collidelistall([sprite.rect for sprite in cell]))
+        return hits
+
+class EntityGroup(pygame.sprite.Group):
+    """A sprite group for one kind of entity that calls hooks as entities join and leave it.
+
+    len() is the live count. on_add hooks run once when a sprite joins and on_remove hooks
+    once when it leaves, by remove() or by Sprite.kill(). kill() removes a sprite from every
+    group it belongs to, so the hooks see deaths without callers reporting them.
+    """
+
+    def __init__(self, *sprites):
+        self.on_add = []
+        self.on_remove = []
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        for hook in self.on_add:
+            hook(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        for hook in self.on_remove:
+            hook(sprite)
+
+class SpritePool:
+    """Preallocated sprites that are reset and reused instead of constructed per spawn.
+
+    acquire() hands out a free sprite after calling its reset() with the given arguments;
+    release() takes it back, and is meant to be hooked to the on_remove of the registries
+    holding the sprites. When none is free, overflow decides: 'grow' allocates another,
+    'drop' returns None and 'recycle' kills and reuses the oldest sprite still in use.
+    """
+
+    def __init__(self, factory, size, overflow='grow'):
+        if overflow not in POOL_OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {POOL_OVERFLOW_POLICIES}, got {overflow!r}")
+        self.factory = factory
+        self.size = size
+        self.overflow = overflow
+        self._free = [factory() for _ in range(size)]
+        self._live = {}  # In order of acquisition, oldest first
+        self.allocated = size
+        self.acquired = 0
+        self.recycled = 0
+        self.dropped = 0
+
+    def acquire(self, *args):
+        if not self._free:
+            if self.overflow == 'grow':
+                self._free.append(self.factory())
+                self.allocated += 1
+            elif self.overflow == 'recycle' and self._live:
+                oldest = next(iter(self._live))
+                oldest.kill()
+                self.release(oldest)
+                self.recycled += 1
+            else:
+                self.dropped += 1
+                return None
+        sprite = self._free.pop()
+        sprite.reset(*args)
+        self._live[sprite] = None
+        self.acquired += 1
+        return sprite
+
+    def release(self, sprite):
+        # Sprites leave several registries when killed, so this may be called more than once
+        if sprite in self._live:
+            del self._live[sprite]
+            self._free.append(sprite)
+
+    def release_all(self):
+        for sprite in list(self._live):
+            sprite.kill()
+            self.release(sprite)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "live": len(self._live),
+            "free": len(self._free),
+            "allocated": self.allocated,
+            "acquired": self.acquired,
+            "recycled": self.recycled,
+            "dropped": self.dropped,
+        }
+
+class MotionEngine:
+    """Positions, velocities and lifetimes of moving sprites kept in NumPy arrays.
+
+    step() steers, moves, expires and culls every tracked sprite in a few vectorized
+    passes, then copies the rounded positions and facing back to the sprites so the
+    usual sprite groups can draw them. Only the sprites whose rounded centre or facing
+    changed are touched, as that copy is a Python loop that can cost what the vectorized
+    passes saved.
+    """
+
+    def __init__(self, capacity=256):
+        self.count = 0
+        self._sprites = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.count
+        arrays = {
+            "_position": np.zeros((capacity, 2)),
+            "_target": np.zeros((capacity, 2)),
+            "_velocity": np.zeros((capacity, 2)),
+            "_half_size": np.zeros((capacity, 2)),
+            "_speed": np.zeros(capacity),
+            "_born": np.zeros(capacity),
+            "_lifetime": np.zeros(capacity),
+            "_direction": np.zeros(capacity, dtype=np.intp),
+            # What the sprite's rect and image were last set to
+            "_shown_center": np.zeros((capacity, 2), dtype=np.intp),
+            "_shown_direction": np.zeros(capacity, dtype=np.intp),
+            "_chases": np.zeros(capacity, dtype=bool),
+            "_culled": np.zeros(capacity, dtype=bool),
+        }
+        for name, array in arrays.items():
+            if old:
+                array[:old] = getattr(self, name)[:old]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def _add(self, sprite, target, chases, born, lifetime, culled):
+        if sprite.slot is not None:
+            return
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = sprite.slot = self.count
+        self.count += 1
+        self._sprites.append(sprite)
+        self._position[i] = sprite.exact_center()
+        self._shown_center[i] = sprite.rect.center
+        # Not a direction, so the first step sets the image
+        self._shown_direction[i] = -1
+        self._target[i] = target
+        self._velocity[i] = 0
+        self._half_size[i] = sprite.rect.width / 2, sprite.rect.height / 2
+        self._speed[i] = sprite.speed
+        self._born[i] = born
+        self._lifetime[i] = lifetime
+        self._direction[i] = RIGHT
+        self._chases[i] = chases
+        self._culled[i] = culled
+
+    def add_chaser(self, sprite):
+        """Track a sprite that steers towards the player, such as an enemy."""
+        self._add(sprite, sprite.rect.center, True, 0, float("inf"), False)
+
+    def add_projectile(self, sprite):
+        """Track a projectile flying at its target until its lifetime ends or it leaves the screen."""
+        self._add(sprite, (sprite.target_x, sprite.target_y), False, sprite.creation_time, sprite.lifetime, True)
+
+    def remove(self, sprite):
+        i = sprite.slot
+        if i is None:
+            return
+        sprite.slot = None
+        last = self.count - 1
+        if i != last:
+            # Move the last entry into the gap so the tracked sprites stay contiguous
+            moved = self._sprites[i] = self._sprites[last]
+            moved.slot = i
+            for array in (self._position, self._target, self._velocity, self._half_size, self._speed,
+                          self._born, self._lifetime, self._direction, self._shown_center, self._shown_direction,
+                          self._chases, self._culled):
+                array[i] = array[last]
+        self._sprites.pop()
+        self.count = last
+
+    def clear(self):
+        for sprite in self._sprites:
+            sprite.slot = None
+        self._sprites.clear()
+        self.count = 0
+
+    def step(self, now, player_center):
+        """Advance every tracked sprite one frame and kill those that expired or left the screen."""
+        n = self.count
+        if not n:
+            return
+        position = self._position[:n]
+        target = self._target[:n]
+        target[self._chases[:n]] = player_center
+
+        delta = target - position
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        moving = distance > 0
+        heading = np.divide(delta, distance[:, None], out=np.zeros_like(delta), where=moving[:, None])
+        velocity = self._velocity[:n]
+        np.multiply(heading, self._speed[:n, None], out=velocity)
+        position += velocity
+
+        dx, dy = heading[:, 0], heading[:, 1]
+        facing = np.where(np.abs(dy) > np.abs(dx), np.where(dy < 0, UP, DOWN), np.where(dx < 0, LEFT, RIGHT))
+        direction = self._direction[:n]
+        direction[moving] = facing[moving]
+
+        half = self._half_size[:n]
+        offscreen = self._culled[:n] & ((position[:, 1] + half[:, 1] < 0) | (position[:, 1] - half[:, 1] > SCREEN_HEIGHT) |
+                                        (position[:, 0] + half[:, 0] < 0) | (position[:, 0] - half[:, 0] > SCREEN_WIDTH))
+        dead = np.flatnonzero((now - self._born[:n] > self._lifetime[:n]) | offscreen)
+
+        sprites = self._sprites
+        center = np.rint(position).astype(np.intp)
+        shown_center = self._shown_center[:n]
+        moved = np.flatnonzero((center != shown_center).any(axis=1))
+        shown_center[moved] = center[moved]
+        for i, xy in zip(moved.tolist(), center[moved].tolist()):
+            sprites[i].rect.center = xy
+        shown_direction = self._shown_direction[:n]
+        turned = np.flatnonzero(direction != shown_direction)
+        shown_direction[turned] = direction[turned]
+        for i, index in zip(turned.tolist(), direction[turned].tolist()):
+            sprite = sprites[i]
+            sprite.image = sprite.images[index]
+        for sprite in [sprites[i] for i in dead]:
+            sprite.kill()
+            self.remove(sprite)
+
 class GameObject(pygame.sprite.Sprite, ABC):
-    def __init__(self, image_path, size):
+    # Index in the motion engine while it moves this sprite, otherwise None
+    slot = None
+    # The float centre behind the integer rect, and the rect centre it was rounded to
+    _exact = None
+    _rounded = None
+
+    def __init__(self, image, original_image=None):
         super().__init__()
-        self.original_image = pygame.image.load(image_path).convert_alpha()
-        self.image = pygame.transform.scale(self.original_image, size)
+        # Both surfaces come from the shared asset cache
+        self.original_image = image if original_image is None else original_image
+        self.image = image
         self.rect = self.image.get_rect()
         self.max_hp = 100
         self.hp = self.max_hp
@@ -31,6 +386,19 @@ class GameObject(pygame.sprite.Sprite, ABC):
     def update(self):
         pass
 
+    def exact_center(self):
+        """The centre as floats; a rect moved by other code, such as a respawn, takes over."""
+        if self._exact is None or self.rect.center != self._rounded:
+            self._exact = self.rect.center
+        return self._exact
+
+    def move_by(self, dx, dy):
+        """Move by a fractional amount, keeping the part the integer rect cannot hold."""
+        x, y = self.exact_center()
+        self._exact = x + dx, y + dy
+        self.rect.center = round(x + dx), round(y + dy)
+        self._rounded = self.rect.center
+
     def draw_hp_bar(self, surface, bar_width=50, bar_height=5):
         bar_x = self.rect.x + (self.rect.width - bar_width) // 2
         bar_y = self.rect.bottom + 5
@@ -55,13 +423,20 @@ class GameObject(pygame.sprite.Sprite, ABC):
 
 class Projectile(GameObject):
     def __init__(self, x, y, target_x, target_y):
-        super().__init__('assets/charge.png', (30, 30))
+        self.images = assets.directions(assets.scaled(PROJECTILE_IMAGE, (30, 30)))
+        super().__init__(self.images[RIGHT], assets.image(PROJECTILE_IMAGE))
+        self.speed = 5
+        self.lifetime = 2000
+        self.reset(x, y, target_x, target_y)
+
+    def reset(self, x, y, target_x, target_y):
+        """Fire this projectile again from (x, y), as a pool does when reusing it."""
+        self.image = self.images[RIGHT]
         self.rect.center = (x, y)
+        self._exact = None
         self.target_x = target_x
         self.target_y = target_y
-        self.speed = 5
         self.creation_time = pygame.time.get_ticks()
-        self.lifetime = 2000
 
     def update(self):
         current_time = pygame.time.get_ticks()
@@ -69,28 +444,20 @@ class Projectile(GameObject):
             self.kill()
             return
 
-        dx = self.target_x - self.rect.centerx
-        dy = self.target_y - self.rect.centery
+        x, y = self.exact_center()
+        dx = self.target_x - x
+        dy = self.target_y - y
         distance = (dx ** 2 + dy ** 2) ** 0.5
         
         if distance > 0:
             dx = dx / distance
             dy = dy / distance
-            self.rect.x += dx * self.speed
-            self.rect.y += dy * self.speed
-            
-            self._update_rotation(dx, dy)
-            self.image = pygame.transform.scale(self.image, (30, 30))
-
-    def _update_rotation(self, dx, dy):
-        if abs(dy) > abs(dx):
-            self.image = pygame.transform.rotate(self.original_image, 90 if dy < 0 else -90)
-        else:
-            self.image = pygame.transform.rotate(self.original_image, 180 if dx < 0 else 0)
+            self.move_by(dx * self.speed, dy * self.speed)
+            self.image = self.images[direction_index(dx, dy)]
 
 class Player(GameObject):
     def __init__(self):
-        super().__init__('assets/idle.png', (50, 50))  # Reduced initial size
+        super().__init__(assets.scaled(PLAYER_IDLE_IMAGE, (50, 50)), assets.image(PLAYER_IDLE_IMAGE))
         self._load_animations()
         self.speed = 5
         self.facing_x = 0
@@ -98,67 +465,49 @@ class Player(GameObject):
         self.is_moving = False
 
     def _load_animations(self):
-        # Load and scale idle animation
-        self.idle_sheet = pygame.image.load('assets/idle.png').convert_alpha()
-        self.idle_image = pygame.Surface((self.idle_sheet.get_width(), self.idle_sheet.get_height()), pygame.SRCALPHA)
-        self.idle_image.blit(self.idle_sheet, (0, 0))
-        self.idle_image = pygame.transform.scale(self.idle_image, (50, 50))  # Scale idle image
-        
-        # Load and scale move animation
-        self.move_sheet = pygame.image.load('assets/move.png').convert_alpha()
-        self.frame_width = self.move_sheet.get_width() // 6
-        self.move_image = pygame.Surface((self.frame_width, self.move_sheet.get_height()), pygame.SRCALPHA)
-        self.move_image.blit(self.move_sheet, (0, 0), (0, 0, self.frame_width, self.move_sheet.get_height()))
-        self.move_image = pygame.transform.scale(self.move_image, (50, 50))  # Scale move image
+        # Idle image and the first frame of the move sheet at 50x50, in all four directions
+        self.idle_images = assets.directions(assets.scaled(PLAYER_IDLE_IMAGE, (50, 50)))
+        self.move_images = assets.directions(assets.frame(PLAYER_MOVE_IMAGE, 0, PLAYER_MOVE_FRAMES, (50, 50)))
 
     def update(self):
+        """Move the player; returns the shot (x, y, target_x, target_y) fired this frame, if any."""
         self._handle_movement()
         self._keep_in_bounds()
-        return self._get_projectile()
+        return self._get_shot()
 
     def _handle_movement(self):
         keys = pygame.key.get_pressed()
         self.is_moving = False
         
         if keys[pygame.K_w]:
-            self._move(0, -1, 90)
+            self._move(0, -1)
         if keys[pygame.K_s]:
-            self._move(0, 1, -90)
+            self._move(0, 1)
         if keys[pygame.K_a]:
-            self._move(-1, 0, 180)
+            self._move(-1, 0)
         if keys[pygame.K_d]:
-            self._move(1, 0, 0)
+            self._move(1, 0)
         
         if not self.is_moving:
             self._update_idle_animation()
 
-    def _move(self, dx, dy, rotation):
+    def _move(self, dx, dy):
         self.rect.x += dx * self.speed
         self.rect.y += dy * self.speed
         self.facing_x = dx
         self.facing_y = dy
         self.is_moving = True
-        self.original_image = self.move_image
-        self.image = pygame.transform.rotate(self.original_image, rotation)
+        self.image = self.move_images[direction_index(dx, dy)]
 
     def _update_idle_animation(self):
-        self.original_image = self.idle_image
-        if self.facing_x == 1:
-            self.image = pygame.transform.rotate(self.original_image, 0)
-        elif self.facing_x == -1:
-            self.image = pygame.transform.rotate(self.original_image, 180)
-        elif self.facing_y == 1:
-            self.image = pygame.transform.rotate(self.original_image, -90)
-        else:
-            self.image = pygame.transform.rotate(self.original_image, 90)
-        self.image = pygame.transform.scale(self.image, (50, 50))
+        self.image = self.idle_images[direction_index(self.facing_x, self.facing_y)]
 
-    def _get_projectile(self):
+    def _get_shot(self):
         keys = pygame.key.get_pressed()
         if keys[pygame.K_SPACE]:
             target_x = self.rect.centerx + (self.facing_x * 1000)
             target_y = self.rect.centery + (self.facing_y * 1000)
-            return Projectile(self.rect.centerx, self.rect.centery, target_x, target_y)
+            return self.rect.centerx, self.rect.centery, target_x, target_y
         return None
 
     def _keep_in_bounds(self):
@@ -168,34 +517,32 @@ class Player(GameObject):
         self.rect.bottom = min(SCREEN_HEIGHT, self.rect.bottom)
 
 class Enemy(GameObject):
+    size = (100, 100)
+
     def __init__(self):
-        super().__init__('assets/idleEnemy.png', (100, 100))
+        self.images = assets.directions(assets.scaled(ENEMY_IMAGE, self.size))
+        super().__init__(self.images[RIGHT], assets.image(ENEMY_IMAGE))
         self.speed = 2
         self.last_shot = 0
         self.shoot_delay = 2000
 
     def update(self, player):
-        self._move_towards_player(player)
+        """Chase the player; returns the shot (x, y, target_x, target_y) fired this frame, if any."""
+        if self.slot is None:
+            self._move_towards_player(player)
         return self._handle_shooting(player)
 
     def _move_towards_player(self, player):
-        dx = player.rect.centerx - self.rect.centerx
-        dy = player.rect.centery - self.rect.centery
+        x, y = self.exact_center()
+        dx = player.rect.centerx - x
+        dy = player.rect.centery - y
         distance = (dx ** 2 + dy ** 2) ** 0.5
         
         if distance > 0:
             dx = dx / distance
             dy = dy / distance
-            self.rect.x += dx * self.speed
-            self.rect.y += dy * self.speed
-            self._update_rotation(dx, dy)
-
-    def _update_rotation(self, dx, dy):
-        if abs(dy) > abs(dx):
-            self.image = pygame.transform.rotate(self.original_image, 90 if dy < 0 else -90)
-        else:
-            self.image = pygame.transform.rotate(self.original_image, 180 if dx < 0 else 0)
-        self.image = pygame.transform.scale(self.image, (100, 100))
+            self.move_by(dx * self.speed, dy * self.speed)
+            self.image = self.images[direction_index(dx, dy)]
 
     def _handle_shooting(self, player):
         current_time = pygame.time.get_ticks()
@@ -209,16 +556,16 @@ class Enemy(GameObject):
                 dy = dy / distance
                 target_x = self.rect.centerx + (dx * 2000)
                 target_y = self.rect.centery + (dy * 2000)
-                return Projectile(self.rect.centerx, self.rect.centery, target_x, target_y)
+                return self.rect.centerx, self.rect.centery, target_x, target_y
         return None
 
 class Boss(Enemy):
+    size = (150, 150)
+
     def __init__(self):
         super().__init__()
         self.max_hp = 200
         self.hp = self.max_hp
-        self.image = pygame.transform.scale(self.original_image, (150, 150))
-        self.rect = self.image.get_rect()
         self.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
         self.speed = 1.5
 
@@ -227,44 +574,83 @@ class Boss(Enemy):
 
 class Collectible(GameObject):
     def __init__(self):
-        super().__init__('assets/idle.png', (30, 30))  # Using a placeholder image
-        self._create_plus_sign()
+        super().__init__(assets.generated('plus_sign', self._create_plus_sign))
+        self.heal_amount = 20
+        self.reset()
+
+    def reset(self):
         self.rect.x = random.randint(0, SCREEN_WIDTH - 30)
         self.rect.y = random.randint(0, SCREEN_HEIGHT - 30)
-        self.heal_amount = 20
 
-    def _create_plus_sign(self):
-        self.image = pygame.Surface((30, 30), pygame.SRCALPHA)
-        pygame.draw.rect(self.image, (0, 255, 0), (13, 5, 4, 20))
-        pygame.draw.rect(self.image, (0, 255, 0), (5, 13, 20, 4))
+    @staticmethod
+    def _create_plus_sign():
+        image = pygame.Surface((30, 30), pygame.SRCALPHA)
+        pygame.draw.rect(image, (0, 255, 0), (13, 5, 4, 20))
+        pygame.draw.rect(image, (0, 255, 0), (5, 13, 20, 4))
+        return image
 
     def update(self):
         pass
 
 class Game:
-    def __init__(self):
+    def __init__(self, vectorized=False):
+        """vectorized moves enemies and projectiles with MotionEngine, which needs NumPy.
+
+        It is off by default: with the sprites drawn one by one, frames come out no faster.
+        """
+        if vectorized and np is None:
+            raise ImportError("The vectorized motion engine needs NumPy")
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.clock = pygame.time.Clock()
         self._load_background()
+        # Shots and pickups are reused from here rather than constructed as they spawn. Only
+        # the player's shots are recycled when their pool runs out, so an enemy shot about
+        # to hit the player never vanishes to make room for another
+        self.projectile_pool = SpritePool(lambda: Projectile(0, 0, 0, 0), PROJECTILE_POOL_SIZE, overflow='recycle')
+        self.enemy_projectile_pool = SpritePool(lambda: Projectile(0, 0, 0, 0), ENEMY_PROJECTILE_POOL_SIZE)
+        self.collectible_pool = SpritePool(Collectible, COLLECTIBLE_POOL_SIZE)
+        self.motion = MotionEngine() if vectorized else None
         self.game_started = False
         self.reset_game()
 
     def _load_background(self):
-        self.background = pygame.image.load('assets/space.png').convert()
-        self.background = pygame.transform.scale(self.background, 
-            (int(SCREEN_WIDTH * 1.5), int(SCREEN_HEIGHT * 1.5)))
+        self.background = assets.scaled(BACKGROUND_IMAGE,
+            (int(SCREEN_WIDTH * 1.5), int(SCREEN_HEIGHT * 1.5)), alpha=False)
         self.camera_x = 0
         self.camera_y = 0
 
     def reset_game(self):
+        self.projectile_pool.release_all()
+        self.enemy_projectile_pool.release_all()
+        self.collectible_pool.release_all()
         self.player = Player()
         self.player.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
         self.all_sprites = pygame.sprite.Group()
-        self.projectiles = pygame.sprite.Group()
-        self.enemy_projectiles = pygame.sprite.Group()
-        self.collectibles = pygame.sprite.Group()
+        # Registries per kind of entity, so each update only walks the entities it needs
+        self.enemies = EntityGroup()  # Bosses are listed here as well
+        self.bosses = EntityGroup()
+        self.projectiles = EntityGroup()  # Fired by the player
+        self.enemy_projectiles = EntityGroup()
+        self.collectibles = EntityGroup()
         self.all_sprites.add(self.player)
+        # Rebuilt every tick after the sprites they hold have moved
+        self.projectile_grid = SpatialHash()
+        self.enemy_projectile_grid = SpatialHash()
+        self.collectible_grid = SpatialHash()
+        for registry, grid, pool in ((self.projectiles, self.projectile_grid, self.projectile_pool),
+                                     (self.enemy_projectiles, self.enemy_projectile_grid, self.enemy_projectile_pool),
+                                     (self.collectibles, self.collectible_grid, self.collectible_pool)):
+            # The grid drops a sprite before the pool can hand it out again somewhere else
+            registry.on_remove.append(grid.remove)
+            registry.on_remove.append(pool.release)
+        if self.motion is not None:
+            self.motion.clear()
+            self.enemies.on_add.append(self.motion.add_chaser)
+            self.enemies.on_remove.append(self.motion.remove)
+            for registry in (self.projectiles, self.enemy_projectiles):
+                registry.on_add.append(self.motion.add_projectile)
+                registry.on_remove.append(self.motion.remove)
         
         self.score = 0
         self.level = 1
@@ -440,70 +826,92 @@ class Game:
         self._draw_game_ui()
         self._handle_spawning()
 
+    def spawn(self, sprite, *registries):
+        """Add a new entity to the drawn sprites and to the registries of its kind."""
+        sprite.add(self.all_sprites, *registries)
+        return sprite
+
+    def fire(self, shot, registry, pool):
+        """Launch a projectile from pool for a (x, y, target_x, target_y) shot into registry."""
+        projectile = pool.acquire(*shot)
+        if projectile is not None:
+            self.spawn(projectile, registry)
+        return projectile
+
+    def allocation_stats(self):
+        """Pool usage and the garbage collections run so far in each generation."""
+        return {
+            "projectiles": self.projectile_pool.stats(),
+            "enemy_projectiles": self.enemy_projectile_pool.stats(),
+            "collectibles": self.collectible_pool.stats(),
+            "gc_collections": [generation["collections"] for generation in gc.get_stats()],
+        }
+
     def _update_player(self):
-        projectile = self.player.update()
-        if projectile:
-            self.all_sprites.add(projectile)
-            self.projectiles.add(projectile)
+        shot = self.player.update()
+        if shot:
+            self.fire(shot, self.projectiles, self.projectile_pool)
 
     def _update_projectiles(self):
-        for projectile in list(self.projectiles):
-            projectile.update()
-            if self._is_off_screen(projectile):
-                projectile.kill()
-
-        for projectile in list(self.enemy_projectiles):
-            projectile.update()
-            if self._is_off_screen(projectile):
-                projectile.kill()
-            if pygame.sprite.collide_rect(projectile, self.player):
-                projectile.kill()
-                self.player.hp -= 10
-                if self.player.hp <= 0:
-                    self.player.hp = 0
-                    self.game_over = True
+        if self.motion is not None:
+            # Moves the enemies as well, ahead of their shooting in _update_enemies
+            self.motion.step(pygame.time.get_ticks(), self.player.rect.center)
+        else:
+            for projectile in list(self.projectiles) + list(self.enemy_projectiles):
+                projectile.update()
+                if self._is_off_screen(projectile):
+                    projectile.kill()
+
+        self.enemy_projectile_grid.rebuild(self.enemy_projectiles)
+        for projectile in self.enemy_projectile_grid.query(self.player.rect):
+            projectile.kill()
+            self.player.hp -= 10
+            if self.player.hp <= 0:
+                self.player.hp = 0
+                self.game_over = True
 
     def _is_off_screen(self, sprite):
         return (sprite.rect.bottom < 0 or sprite.rect.top > SCREEN_HEIGHT or 
                 sprite.rect.right < 0 or sprite.rect.left > SCREEN_WIDTH)
 
     def _update_enemies(self):
-        for sprite in list(self.all_sprites):
-            if isinstance(sprite, (Enemy, Boss)):
-                enemy_projectile = sprite.update(self.player)
-                if enemy_projectile:
-                    self.all_sprites.add(enemy_projectile)
-                    self.enemy_projectiles.add(enemy_projectile)
-                
-                hits = pygame.sprite.spritecollide(sprite, self.projectiles, True)
-                if hits:
-                    sprite.hp -= 20
-                    if sprite.hp > 0:
-                        sprite.max_hp = int(sprite.max_hp * 1.5)
-                    else:
-                        sprite.kill()
-                        self.score += 100 if isinstance(sprite, Boss) else 10
-                        self.check_level_up()
+        self.projectile_grid.rebuild(self.projectiles)
+        for sprite in list(self.enemies):
+            shot = sprite.update(self.player)
+            if shot:
+                self.fire(shot, self.enemy_projectiles, self.enemy_projectile_pool)
+
+            hits = self.projectile_grid.query(sprite.rect)
+            for projectile in hits:
+                # Killing also takes it out of the grid, so it is used up by the first enemy it hits
+                projectile.kill()
+            if hits:
+                sprite.hp -= 20
+                if sprite.hp > 0:
+                    sprite.max_hp = int(sprite.max_hp * 1.5)
+                else:
+                    self.score += 100 if self.bosses.has(sprite) else 10
+                    sprite.kill()
+                    self.check_level_up()
 
     def _update_collectibles(self):
         current_time = pygame.time.get_ticks()
         if current_time - self.last_collectible_spawn > self.collectible_spawn_delay:
-            collectible = Collectible()
-            self.all_sprites.add(collectible)
-            self.collectibles.add(collectible)
+            collectible = self.collectible_pool.acquire()
+            if collectible is not None:
+                self.spawn(collectible, self.collectibles)
             self.last_collectible_spawn = current_time
 
-        for collectible in list(self.collectibles):
-            if pygame.sprite.collide_rect(collectible, self.player):
-                self.player.hp = min(self.player.max_hp, self.player.hp + collectible.heal_amount)
-                collectible.kill()
+        self.collectible_grid.rebuild(self.collectibles)
+        for collectible in self.collectible_grid.query(self.player.rect):
+            self.player.hp = min(self.player.max_hp, self.player.hp + collectible.heal_amount)
+            collectible.kill()
 
     def _draw_game_ui(self):
         self.all_sprites.draw(self.screen)
         
-        for sprite in self.all_sprites:
-            if isinstance(sprite, (Enemy, Boss)):
-                sprite.draw_hp_bar(self.screen)
+        for sprite in self.enemies:
+            sprite.draw_hp_bar(self.screen)
         
         score_text = self.font.render(f'Score: {self.score}', True, (255, 255, 255))
         score_rect = score_text.get_rect()
@@ -519,15 +927,14 @@ class Game:
 
     def _handle_spawning(self):
         if self.level == 3 and not self.boss_spawned and self.get_current_enemy_count() == 0:
-            boss = Boss()
-            self.all_sprites.add(boss)
+            self.spawn(Boss(), self.enemies, self.bosses)
             self.boss_spawned = True
         elif (random.randint(0, 1000) < self.get_spawn_rate() and 
               self.get_current_enemy_count() < self.get_max_enemies()):
-            self.all_sprites.add(Enemy())
+            self.spawn(Enemy(), self.enemies)
 
     def get_current_enemy_count(self):
-        return sum(1 for sprite in self.all_sprites if isinstance(sprite, Enemy))
+        return len(self.enemies)
 
 if __name__ == "__main__":
     game = Game()
@@ -0,0 +1,204 @@
+"""
+Group Name: CAS/DAN GROUP-15
+Group Members:
+- S388343 Princy Patel
+- S390060 Lamia Sarwar 
+- S389242 Mahesh Chandra Regmi
+- S390909 Gallage Achintha Methsara Fernando
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+# Run without a window; set before pygame is imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import game
+
+DEFAULT_COUNTS = (100, 500, 1000, 2000, 5000)
+# How much more collision time per projectile a count may take than the smallest count did
+DEFAULT_TOLERANCE = 1.5
+# The level 5 enemy cap
+DEFAULT_ENEMIES = 25
+
+def make_game(seed=0, vectorized=False):
+    """A started game at the top level whose entities never die, so counts stay fixed."""
+    random.seed(seed)
+    g = game.Game(vectorized)
+    g.game_started = True
+    g.level = g.max_level
+    g.player.max_hp = g.player.hp = 10 ** 9
+    return g
+
+def populate(g, projectiles, enemies):
+    """Top the game up to the given projectile (half of them enemy fire) and enemy counts."""
+    while g.get_current_enemy_count() < enemies:
+        enemy = game.Enemy()
+        enemy.rect.center = (random.randint(0, game.SCREEN_WIDTH), random.randint(0, game.SCREEN_HEIGHT))
+        enemy.max_hp = enemy.hp = 10 ** 9
+        g.spawn(enemy, g.enemies)
+    for group, count in ((g.projectiles, projectiles - projectiles // 2), (g.enemy_projectiles, projectiles // 2)):
+        while len(group) < count:
+            # Aimed far away in a random direction, like real shots, so they keep moving until culled
+            x, y = random.randint(0, game.SCREEN_WIDTH), random.randint(0, game.SCREEN_HEIGHT)
+            angle = random.uniform(0, 2 * math.pi)
+            projectile = game.Projectile(x, y, x + 2000 * math.cos(angle), y + 2000 * math.sin(angle))
+            projectile.lifetime = 10 ** 9
+            g.spawn(projectile, group)
+
+def brute_force_collisions(g):
+    # The queries Game made before the spatial hash, without killing anything
+    for enemy in g.enemies:
+        pygame.sprite.spritecollide(enemy, g.projectiles, False)
+    pygame.sprite.spritecollide(g.player, g.enemy_projectiles, False)
+    pygame.sprite.spritecollide(g.player, g.collectibles, False)
+
+def grid_collisions(g):
+    g.projectile_grid.rebuild(g.projectiles)
+    for enemy in g.enemies:
+        g.projectile_grid.query(enemy.rect)
+    g.enemy_projectile_grid.rebuild(g.enemy_projectiles)
+    g.enemy_projectile_grid.query(g.player.rect)
+    g.collectible_grid.rebuild(g.collectibles)
+    g.collectible_grid.query(g.player.rect)
+
+def _time_frames(g, frames, projectiles, enemies, step):
+    timings = []
+    for _ in range(frames):
+        populate(g, projectiles, enemies)
+        start = time.perf_counter()
+        step()
+        timings.append(time.perf_counter() - start)
+    return sum(timings) / len(timings)
+
+def run_case(projectiles, enemies, frames, vectorized=False):
+    g = make_game(vectorized=vectorized)
+    populate(g, projectiles, enemies)
+    brute = _time_frames(g, frames, projectiles, enemies, lambda: brute_force_collisions(g))
+    grid = _time_frames(g, frames, projectiles, enemies, lambda: grid_collisions(g))
+    frame = _time_frames(g, frames, projectiles, enemies, g._update_game_state)
+    return {
+        "projectiles": projectiles,
+        "enemies": enemies,
+        "brute_force_collision_seconds": brute,
+        "grid_collision_seconds": grid,
+        "frame_seconds": frame,
+        "vectorized": g.motion is not None,
+        "collision_seconds_per_projectile": grid / projectiles if projectiles else None,
+    }
+
+def run_suite(counts, enemies, frames, vectorized=False, tolerance=DEFAULT_TOLERANCE, report=print):
+    """Time every count and check that collision cost per projectile stays flat as it grows.
+
+    The check fails if any count spends more than tolerance times the collision time per
+    projectile of the smallest count. Whole-frame time is reported but not checked: every
+    projectile is still moved and drawn, so it grows with the count.
+    """
+    results = []
+    for projectiles in sorted(counts):
+        result = run_case(projectiles, enemies, frames, vectorized)
+        results.append(result)
+        report(f"{projectiles:6d} projectiles  collisions: brute force {result['brute_force_collision_seconds'] * 1000:8.2f} ms"
+               f"  grid {result['grid_collision_seconds'] * 1000:8.2f} ms ({result['collision_seconds_per_projectile'] * 1e6:5.2f} us each)"
+               f"  whole frame {result['frame_seconds'] * 1000:8.2f} ms")
+    baseline = results[0]["collision_seconds_per_projectile"]
+    worst = max(results, key=lambda result: result["collision_seconds_per_projectile"])
+    ratio = worst["collision_seconds_per_projectile"] / baseline
+    passed = ratio <= tolerance
+    report(f"{'PASS' if passed else 'FAIL'}: collision time per projectile at most {ratio:.2f}x that at"
+           f" {results[0]['projectiles']} projectiles (tolerance {tolerance:.2f}x)")
+    return {"meta": _meta(enemies, frames),
+            "acceptance": {"tolerance": tolerance, "worst_ratio": ratio, "passed": passed},
+            "results": results}
+
+class HeldKeys:
+    """Stands in for the result of pygame.key.get_pressed() with a fixed set of keys down."""
+
+    def __init__(self, *keys):
+        self.keys = set(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+def run_steady_state(frames, enemies, vectorized=False, report=print):
+    """Play at real speed with fire held down and report what the pools and GC did meanwhile.
+
+    The first two seconds fill the projectile pools and are not counted.
+    """
+    g = make_game(vectorized=vectorized)
+    populate(g, 0, enemies)
+    get_pressed = pygame.key.get_pressed
+    pygame.key.get_pressed = lambda: HeldKeys(pygame.K_SPACE)
+    try:
+        for _ in range(2 * game.FPS):
+            g._update_game_state()
+            g.clock.tick(game.FPS)
+        before = g.allocation_stats()
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        for _ in range(frames):
+            g._update_game_state()
+            g.clock.tick(game.FPS)
+        seconds = time.perf_counter() - start
+        after = g.allocation_stats()
+        blocks = sys.getallocatedblocks() - blocks
+    finally:
+        pygame.key.get_pressed = get_pressed
+
+    result = {"frames": frames, "enemies": enemies, "vectorized": g.motion is not None, "seconds": seconds, "allocated_blocks_delta": blocks,
+              "gc_collections": [b - a for a, b in zip(before["gc_collections"], after["gc_collections"])]}
+    for name in ("projectiles", "enemy_projectiles", "collectibles"):
+        result[name] = {key: after[name][key] - before[name][key] for key in ("allocated", "acquired", "recycled", "dropped")}
+        result[name]["live"] = after[name]["live"]
+        report(f"{name:17s} acquired {result[name]['acquired']:5d}  newly allocated {result[name]['allocated']:3d}"
+               f"  recycled {result[name]['recycled']:4d}  dropped {result[name]['dropped']:3d}  live {result[name]['live']:3d}")
+    report(f"gc collections per generation {result['gc_collections']}, net allocated blocks {blocks:+d}")
+    return {"meta": _meta(enemies, frames), "steady_state": result}
+
+def _meta(enemies, frames):
+    return {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "numpy": game.np.__version__ if game.np is not None else None,
+        "platform": platform.platform(),
+        "enemies": enemies,
+        "frames": frames,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress the game's per-frame update with many projectiles.")
+    parser.add_argument("--projectiles", type=int, nargs="+", default=list(DEFAULT_COUNTS),
+                        help="projectile counts to run, half player and half enemy fire")
+    parser.add_argument("--enemies", type=int, default=DEFAULT_ENEMIES)
+    parser.add_argument("--frames", type=int, default=60, help="frames timed per case")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="collision time per projectile allowed, relative to the smallest count (default: 1.5)")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="move sprites with the NumPy motion engine instead of one by one in Python")
+    parser.add_argument("--steady-state", action="store_true",
+                        help="instead of the stress cases, play with fire held and report pool and GC activity")
+    parser.add_argument("--output", default="game_benchmark_results.json", help="where to write the JSON results")
+    args = parser.parse_args(argv)
+    if args.steady_state:
+        results = run_steady_state(args.frames, args.enemies, args.vectorized)
+        passed = True
+    else:
+        results = run_suite(args.projectiles, args.enemies, args.frames, args.vectorized, args.tolerance)
+        passed = results["acceptance"]["passed"]
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    pygame.quit()
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1434 @@
+"""
+Group Name: CAS/DAN GROUP-15
+Group Members:
+- S388343 Princy Patel
+- S390060 Lamia Sarwar 
+- S389242 Mahesh Chandra Regmi
+- S390909 Gallage Achintha Methsara Fernando
+"""
+
+import atexit
+import copy
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+from abc import ABC, abstractmethod
+
+HISTORY_MEMORY_BUDGET = 512 * 1024 * 1024
+RESULT_CACHE_BUDGET = 256 * 1024 * 1024
+WORKSPACE_MEMORY_BUDGET = 1024 * 1024 * 1024
+
+SESSION_FILE = "session.json"
+SESSION_VERSION = 1
+# Session arrays are named "<prefix>-<unique>.npy"; anything else in the directory is left alone
+SESSION_ARRAY_PREFIXES = ("original", "preview", "checkpoint-")
+
+# Images above LARGE_IMAGE_BYTES are kept in memory-mapped files and processed in tiles
+# of at most TILE_BUDGET bytes, so peak memory does not grow with the image size.
+LARGE_IMAGE_BYTES = 256 * 1024 * 1024
+TILE_BUDGET = 64 * 1024 * 1024
+
+# Below this many output bytes a render is not worth splitting across threads
+MIN_PARALLEL_BYTES = 4 * 1024 * 1024
+
+# The viewport is drawn as VIEWPORT_TILE_SIZE canvas pixel tiles, at up to MAX_ZOOM
+# canvas pixels per image pixel
+VIEWPORT_TILE_SIZE = 256
+VIEWPORT_CACHE_BUDGET = 64 * 1024 * 1024
+MAX_ZOOM = 16.0
+
+# A reduced decode is used for the preview as long as its long side stays at least this big
+PREVIEW_DECODE_SIZE = 512
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Thumbnails fit in THUMBNAIL_SIZE pixels square and are stored raw, so showing them
+# again never decodes anything
+THUMBNAIL_SIZE = 96
+THUMBNAIL_INDEX_FILE = "index.json"
+THUMBNAIL_INDEX_VERSION = 2
+
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+ROTATE_CODES = {
+    1: cv2.ROTATE_90_CLOCKWISE,
+    2: cv2.ROTATE_180,
+    3: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+IDENTITY_LUT = np.arange(256, dtype=np.uint8)
+
+class ImageProcessor(ABC):
+    # Rows of context a horizontal strip needs on each side to be processed on its own,
+    # or None if the processor changes the geometry and has to go through a RenderPlan
+    halo = None
+
+    @abstractmethod
+    def process(self, image):
+        pass
+
+    @abstractmethod
+    def fuse_into(self, plan):
+        pass
+
+    def cache_key(self):
+        """The operation and its parameters, e.g. ("CropProcessor", ("ratio", 2.0), ("x1", 10), ...)."""
+        return (type(self).__name__,) + tuple(sorted(vars(self).items()))
+
+    def to_dict(self):
+        return {"type": type(self).__name__, "params": dict(vars(self))}
+
+def processor_from_dict(data):
+    types = {}
+    pending = [ImageProcessor]
+    while pending:
+        cls = pending.pop()
+        types[cls.__name__] = cls
+        pending.extend(cls.__subclasses__())
+    cls = types.get(data.get("type"))
+    if cls is None or cls is ImageProcessor:
+        raise Exception(f"Unknown operation: {data.get('type')}")
+    return cls(**data.get("params", {}))
+
+class GrayscaleProcessor(ImageProcessor):
+    # Grayscale results stay single-channel; only the preview widgets ever see them expanded
+    halo = 0
+
+    def process(self, image):
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    def fuse_into(self, plan):
+        if not plan.grayscale:
+            # Tables so far were meant for the colour channels, before the conversion
+            plan.color_lut, plan.lut = plan.lut, None
+        plan.grayscale = True
+
+class RotateProcessor(ImageProcessor):
+    def process(self, image):
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+
+    def fuse_into(self, plan):
+        plan.rotation = (plan.rotation + 1) % 4
+
+class CropProcessor(ImageProcessor):
+    def __init__(self, x1, y1, x2, y2, ratio):
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+        self.ratio = ratio
+
+    def _image_coordinates(self):
+        return (int(self.x1 * self.ratio), int(self.y1 * self.ratio),
+                int(self.x2 * self.ratio), int(self.y2 * self.ratio))
+
+    def process(self, image):
+        x1_image, y1_image, x2_image, y2_image = self._image_coordinates()
+        return image[y1_image:y2_image, x1_image:x2_image]
+
+    def fuse_into(self, plan):
+        plan.crop_output(*self._image_coordinates())
+
+class PointProcessor(ImageProcessor):
+    """A per-pixel adjustment that depends only on the pixel's own value.
+
+    Subclasses describe the curve in transfer(); it is sampled once into a 256-entry
+    table. Consecutive point operations fuse into a single table, so any chain of them
+    costs one cv2.LUT pass over the image.
+    """
+
+    halo = 0
+
+    @abstractmethod
+    def transfer(self, values):
+        """Map an array of the input levels 0-255 to output levels (clipped to 0-255 afterwards)."""
+        pass
+
+    def lut(self):
+        values = self.transfer(np.arange(256, dtype=np.float64))
+        return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+    def process(self, image):
+        return apply_lut(image, self.lut())
+
+    def fuse_into(self, plan):
+        plan.add_lut(self.lut())
+
+class BrightnessProcessor(PointProcessor):
+    def __init__(self, amount):
+        self.amount = amount
+
+    def transfer(self, values):
+        return values + self.amount
+
+class ContrastProcessor(PointProcessor):
+    def __init__(self, factor):
+        self.factor = factor
+
+    def transfer(self, values):
+        return (values - 127.5) * self.factor + 127.5
+
+class GammaProcessor(PointProcessor):
+    def __init__(self, gamma):
+        if gamma <= 0:
+            raise ValueError("Gamma must be positive")
+        self.gamma = gamma
+
+    def transfer(self, values):
+        return 255 * (values / 255) ** (1 / self.gamma)
+
+class InvertProcessor(PointProcessor):
+    def transfer(self, values):
+        return 255 - values
+
+class ThresholdProcessor(PointProcessor):
+    def __init__(self, level=128):
+        self.level = level
+
+    def transfer(self, values):
+        return np.where(values >= self.level, 255, 0)
+
+def apply_lut(image, lut, in_place=False):
+    """One cv2.LUT pass. With in_place the table is applied over image instead of a new array."""
+    if in_place and image.flags.writeable and image.flags.c_contiguous:
+        return cv2.LUT(image, lut, dst=image)
+    return cv2.LUT(image, lut)
+
+class RenderPlan:
+    """A processor chain fused into one source crop, one rotation, optional grayscale and
+    at most two lookup tables: one for the colour channels before the grayscale conversion
+    and one after it.
+
+    Coordinates are kept at the resolution of the source the plan was created for, so
+    the same plan can render a full-resolution export or a preview from any pyramid level.
+    """
+
+    def __init__(self, width, height):
+        self.source_width = width
+        self.source_height = height
+        self.crop = (0, 0, width, height)
+        self.rotation = 0
+        self.grayscale = False
+        self.color_lut = None
+        self.lut = None
+
+    @classmethod
+    def from_processors(cls, image, processors):
+        height, width = image.shape[:2]
+        return cls.for_size(width, height, processors)
+
+    @classmethod
+    def for_size(cls, width, height, processors):
+        plan = cls(width, height)
+        for processor in processors:
+            processor.fuse_into(plan)
+        return plan
+
+    @property
+    def key(self):
+        """Hashable description of the rendered result, equal for plans that render the same pixels."""
+        return (self.source_width, self.source_height, self.crop, self.rotation, self.grayscale,
+                _lut_key(self.color_lut), _lut_key(self.lut))
+
+    @property
+    def output_size(self):
+        x1, y1, x2, y2 = self.crop
+        if self.rotation % 2:
+            return y2 - y1, x2 - x1
+        return x2 - x1, y2 - y1
+
+    def crop_output(self, x1, y1, x2, y2):
+        # Map a rectangle given in output coordinates back through the rotation onto the source
+        out_width, out_height = self.output_size
+        x1, x2 = sorted((min(max(x1, 0), out_width), min(max(x2, 0), out_width)))
+        y1, y2 = sorted((min(max(y1, 0), out_height), min(max(y2, 0), out_height)))
+        if x2 <= x1 or y2 <= y1:
+            raise Exception("Crop area is outside the image")
+
+        left, top, right, bottom = self.crop
+        width, height = right - left, bottom - top
+        if self.rotation == 0:
+            rect = (x1, y1, x2, y2)
+        elif self.rotation == 1:
+            rect = (y1, height - x2, y2, height - x1)
+        elif self.rotation == 2:
+            rect = (width - x2, height - y2, width - x1, height - y1)
+        else:
+            rect = (width - y2, x1, width - y1, x2)
+        self.crop = (left + rect[0], top + rect[1], left + rect[2], top + rect[3])
+
+    def add_lut(self, lut):
+        # Composing tables is indexing one with the other: the result maps x to lut[previous[x]]
+        if self.lut is not None:
+            lut = lut[self.lut]
+        self.lut = None if np.array_equal(lut, IDENTITY_LUT) else lut
+
+    def render(self, source):
+        """Render from the original or any downscaled copy of it."""
+        scale_x = source.shape[1] / self.source_width
+        scale_y = source.shape[0] / self.source_height
+        x1, y1, x2, y2 = self.crop
+        x1, y1 = int(x1 * scale_x), int(y1 * scale_y)
+        x2 = max(x1 + 1, int(np.ceil(x2 * scale_x)))
+        y2 = max(y1 + 1, int(np.ceil(y2 * scale_y)))
+
+        # Until a step allocates, image is a view of the source and must not be written to
+        image = source[y1:y2, x1:x2]
+        owned = False
+        if self.rotation:
+            image = cv2.rotate(image, ROTATE_CODES[self.rotation])
+            owned = True
+        if self.color_lut is not None:
+            image = apply_lut(image, self.color_lut, in_place=owned)
+            owned = True
+        if self.grayscale:
+            gray = GrayscaleProcessor().process(image)
+            owned = owned or gray is not image
+            image = gray
+        if self.lut is not None:
+            image = apply_lut(image, self.lut, in_place=owned)
+        return image
+
+    def render_tiled(self, source, tile_budget=TILE_BUDGET, postprocess=None):
+        """Render at full resolution into a disk-backed array, one output tile at a time.
+
+        Each tile is rendered through a copy of the plan cropped to that tile, so only the
+        matching region of a memory-mapped source is ever read.
+        """
+        out_width, out_height = self.output_size
+        pixel_bytes = source.itemsize * (source.shape[2] if source.ndim == 3 else 1)
+        tile_size = max(64, int((tile_budget / (2 * pixel_bytes)) ** 0.5))
+
+        output = None
+        for y1 in range(0, out_height, tile_size):
+            y2 = min(y1 + tile_size, out_height)
+            for x1 in range(0, out_width, tile_size):
+                x2 = min(x1 + tile_size, out_width)
+                tile_plan = copy.copy(self)
+                tile_plan.crop_output(x1, y1, x2, y2)
+                tile = tile_plan.render(source)
+                if postprocess is not None:
+                    tile = postprocess(tile)
+                if output is None:
+                    output = create_disk_image((out_height, out_width) + tile.shape[2:], tile.dtype)
+                output[y1:y2, x1:x2] = tile
+        output.flush()
+        return output
+
+def _lut_key(lut):
+    return None if lut is None else lut.tobytes()
+
+class PreviewPyramid:
+    """Halving mipmap chain of an image, built once and reused for every redraw."""
+
+    def __init__(self, image, min_size=256, tile_budget=TILE_BUDGET):
+        self.image = image
+        self.levels = [image]
+        level = image
+        while max(level.shape[:2]) > min_size and min(level.shape[:2]) > 1:
+            level = _halve(level, tile_budget)
+            self.levels.append(level)
+
+    def rebase(self, image):
+        """Swap the full-size level for an array with the same pixels, e.g. its memory-mapped copy."""
+        self.image = self.levels[0] = image
+
+    def nearest_level(self, width, height):
+        for level in reversed(self.levels):
+            if level.shape[1] >= width and level.shape[0] >= height:
+                return level
+        return self.levels[0]
+
+    def resize(self, width, height):
+        level = self.nearest_level(width, height)
+        return cv2.resize(level, (width, height), interpolation=cv2.INTER_AREA)
+
+def render_preview(pyramid, plan, width, height, full_resolution=None, interpolation=cv2.INTER_AREA):
+    """Render a plan at width x height from the smallest pyramid level that still covers it.
+
+    When no level is big enough and the full-resolution image is given, it is used instead.
+    """
+    out_width, out_height = plan.output_size
+    scale = max(width / out_width, height / out_height)
+    needed_width = int(np.ceil(plan.source_width * scale))
+    needed_height = int(np.ceil(plan.source_height * scale))
+    level = pyramid.nearest_level(needed_width, needed_height)
+    if full_resolution is not None and (level.shape[1] < needed_width or level.shape[0] < needed_height):
+        level = full_resolution
+    return cv2.resize(plan.render(level), (width, height), interpolation=interpolation)
+
+def render_region(pyramid, plan, rect, width, height, full_resolution=None):
+    """Render the part of the plan's output inside rect, in output pixels, at width x height.
+
+    Only that region of a pyramid level or of the full-resolution image is read.
+    """
+    region = copy.copy(plan)
+    region.crop_output(*rect)
+    # Magnified pixels are shown as crisp blocks, as in any image viewer
+    magnified = width > rect[2] - rect[0]
+    return render_preview(pyramid, region, width, height, full_resolution,
+                          cv2.INTER_NEAREST if magnified else cv2.INTER_AREA)
+
+class Viewport:
+    """A zoomed and panned window onto the output image, in canvas pixels.
+
+    zoom is canvas pixels per image pixel and (x, y) is the image point under the
+    canvas's top-left corner, so canvas and image coordinates convert exactly at any zoom.
+    The image is covered by a fixed grid of tiles per zoom level; panning only brings new
+    tiles into view and never changes the ones already rendered.
+    """
+
+    def __init__(self, width, height, tile_size=VIEWPORT_TILE_SIZE):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.image_width = 0
+        self.image_height = 0
+        self.zoom = 1.0
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def state(self):
+        return (self.width, self.height, self.image_width, self.image_height, self.zoom, self.x, self.y)
+
+    def fit_zoom(self):
+        if not self.image_width or not self.image_height:
+            return 1.0
+        # Like the fixed-size preview before it, fitting never enlarges a small image
+        return min(self.width / self.image_width, self.height / self.image_height, 1.0)
+
+    def min_zoom(self):
+        return min(self.fit_zoom(), 0.1)
+
+    def set_image_size(self, width, height):
+        """Show an image of this size, fitting it to the canvas if the size changed."""
+        if (width, height) == (self.image_width, self.image_height):
+            return False
+        self.image_width = width
+        self.image_height = height
+        self.fit()
+        return True
+
+    def resize(self, width, height):
+        center = self.to_image(self.width / 2, self.height / 2)
+        self.width = max(1, width)
+        self.height = max(1, height)
+        self._center_on(*center)
+
+    def fit(self):
+        self.zoom = self.fit_zoom()
+        self._center_on(self.image_width / 2, self.image_height / 2)
+
+    def zoom_to(self, zoom, canvas_x=None, canvas_y=None):
+        """Zoom keeping the image point under (canvas_x, canvas_y), by default the centre, in place."""
+        if canvas_x is None:
+            canvas_x, canvas_y = self.width / 2, self.height / 2
+        image_x, image_y = self.to_image(canvas_x, canvas_y)
+        self.zoom = min(max(zoom, self.min_zoom()), MAX_ZOOM)
+        self.x = image_x - canvas_x / self.zoom
+        self.y = image_y - canvas_y / self.zoom
+        self._clamp()
+
+    def pan(self, dx, dy):
+        """Move the image by (dx, dy) canvas pixels."""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+        self._clamp()
+
+    def to_image(self, canvas_x, canvas_y):
+        return self.x + canvas_x / self.zoom, self.y + canvas_y / self.zoom
+
+    def to_canvas(self, image_x, image_y):
+        return (image_x - self.x) * self.zoom, (image_y - self.y) * self.zoom
+
+    def tiles(self):
+        """Visible tiles as (column, row, canvas x, canvas y, width, height, image rect).
+
+        A tile spans a whole number of image pixels, and canvas edges are rounded from
+        the same image edges on both sides, so neighbouring tiles never gap or overlap.
+        """
+        step = max(1, round(self.tile_size / self.zoom))
+        origin_x, origin_y = round(self.x * self.zoom), round(self.y * self.zoom)
+        columns = range(max(0, int(self.x // step)),
+                        min(-(-self.image_width // step), int((self.x + self.width / self.zoom) // step) + 1))
+        rows = range(max(0, int(self.y // step)),
+                     min(-(-self.image_height // step), int((self.y + self.height / self.zoom) // step) + 1))
+        tiles = []
+        for row in rows:
+            y1, y2 = row * step, min((row + 1) * step, self.image_height)
+            top, bottom = round(y1 * self.zoom) - origin_y, round(y2 * self.zoom) - origin_y
+            for column in columns:
+                x1, x2 = column * step, min((column + 1) * step, self.image_width)
+                left, right = round(x1 * self.zoom) - origin_x, round(x2 * self.zoom) - origin_x
+                if right > left and bottom > top:
+                    tiles.append((column, row, left, top, right - left, bottom - top, (x1, y1, x2, y2)))
+        return tiles
+
+    def _center_on(self, image_x, image_y):
+        self.x = image_x - self.width / 2 / self.zoom
+        self.y = image_y - self.height / 2 / self.zoom
+        self._clamp()
+
+    def _clamp(self):
+        # An image smaller than the canvas is centred; a bigger one cannot be panned off it
+        visible_width, visible_height = self.width / self.zoom, self.height / self.zoom
+        if visible_width >= self.image_width:
+            self.x = (self.image_width - visible_width) / 2
+        else:
+            self.x = min(max(self.x, 0.0), self.image_width - visible_width)
+        if visible_height >= self.image_height:
+            self.y = (self.image_height - visible_height) / 2
+        else:
+            self.y = min(max(self.y, 0.0), self.image_height - visible_height)
+
+def _halve(image, tile_budget):
+    height, width = image.shape[:2]
+    size = (max(1, width // 2), max(1, height // 2))
+    if image.nbytes <= tile_budget or height < 2:
+        return _halve_rows(image, size[0])
+
+    # Halve in strips of an even number of rows so a memory-mapped level is never read whole.
+    # An odd last row goes into the last strip
+    output = np.empty((size[1], size[0]) + image.shape[2:], image.dtype)
+    strips = list(_row_strips(image[:size[1] * 2], tile_budget, multiple=2))
+    strips[-1] = (strips[-1][0], height)
+    for y1, y2 in strips:
+        output[y1 // 2:y1 // 2 + (y2 - y1) // 2] = _halve_rows(image[y1:y2], size[0])
+    return output
+
+def _halve_rows(rows, width):
+    # Average each pair of rows, and an odd last row with the pair above it, so a level
+    # comes out the same whether it was halved whole or in strips
+    height = rows.shape[0]
+    if height % 2 == 0 or height < 3:
+        return cv2.resize(rows, (width, max(1, height // 2)), interpolation=cv2.INTER_AREA)
+    last = cv2.resize(rows[-3:], (width, 1), interpolation=cv2.INTER_AREA)
+    if height == 3:
+        return last
+    pairs = cv2.resize(rows[:-3], (width, height // 2 - 1), interpolation=cv2.INTER_AREA)
+    return np.concatenate([pairs, last])
+
+def _row_strips(image, tile_budget, multiple=1):
+    row_bytes = max(1, image.nbytes // max(1, image.shape[0]))
+    rows = max(multiple, tile_budget // row_bytes // multiple * multiple)
+    for y1 in range(0, image.shape[0], rows):
+        yield y1, min(y1 + rows, image.shape[0])
+
+def create_disk_image(shape, dtype):
+    """Allocate a writable memory-mapped .npy array in the temp directory."""
+    handle, path = tempfile.mkstemp(prefix="image-editor-", suffix=".npy")
+    os.close(handle)
+    image = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    try:
+        # POSIX keeps the mapping alive after unlinking, so the file vanishes with the array
+        os.remove(path)
+    except OSError:
+        atexit.register(_remove_quietly, path)
+    return image
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def is_disk_backed(image):
+    return isinstance(_owning_array(image), np.memmap)
+
+def map_strips(image, func, tile_budget=TILE_BUDGET):
+    """Apply a per-pixel func to a disk-backed image strip by strip."""
+    output = None
+    for y1, y2 in _row_strips(image, tile_budget):
+        strip = func(image[y1:y2])
+        if output is None:
+            output = create_disk_image(image.shape[:2] + strip.shape[2:], strip.dtype)
+        output[y1:y2] = strip
+    output.flush()
+    return output
+
+def load_image(path, large_image_bytes=LARGE_IMAGE_BYTES, tile_budget=TILE_BUDGET):
+    """Load an image in OpenCV's BGR order, spilling it to a memory-mapped file when it is large.
+
+    A .npy file is mapped directly without decoding. Compressed formats still need one
+    full decode, but it is written to disk strip by strip and the decoded buffer is
+    released before any editing starts.
+    """
+    if path.lower().endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+
+    image = cv2.imread(path)
+    if image is None:
+        raise Exception("Failed to load image")
+    if image.nbytes <= large_image_bytes:
+        return image
+    return map_strips(image, lambda strip: strip, tile_budget)
+
+def read_image_size(path):
+    """Width and height from the file header, after EXIF orientation, without decoding pixels."""
+    with Image.open(path) as image:
+        width, height = image.size
+        orientation = image.getexif().get(0x0112, 1)
+    # Orientations 5-8 are stored transposed; cv2.imread applies the rotation on decode
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    return width, height
+
+class ImageSource:
+    """The original image of an editing session.
+
+    Opening a file only reads its header and a reduced-resolution decode, which is all the
+    preview canvases need. The full-resolution decode happens once, on the first load().
+    """
+
+    def __init__(self, width, height, preview, loader=None, image=None, path=None):
+        self.width = width
+        self.height = height
+        self.preview = preview
+        self.path = path
+        self.identity = _file_identity(path) if path else None
+        self._loader = loader
+        self._image = image
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_array(cls, image, path=None):
+        height, width = image.shape[:2]
+        return cls(width, height, image, image=image, path=path)
+
+    @classmethod
+    def open(cls, path, preview_size=PREVIEW_DECODE_SIZE):
+        if path.lower().endswith(".npy"):
+            return cls.from_array(load_image(path), path)
+
+        try:
+            width, height = read_image_size(path)
+        except Exception:
+            return cls.from_array(load_image(path), path)
+
+        flag = _reduced_decode_flag(width, height, preview_size)
+        if flag is None:
+            return cls.from_array(load_image(path), path)
+        preview = cv2.imread(path, flag)
+        if preview is None:
+            raise Exception("Failed to load image")
+        return cls(width, height, preview, loader=lambda: load_image(path), path=path)
+
+    @property
+    def image(self):
+        """The full-resolution array, or None if it has not been decoded yet."""
+        return self._image
+
+    @property
+    def is_loaded(self):
+        return self._image is not None
+
+    def load(self):
+        # Safe to call from worker threads; concurrent callers wait for a single decode
+        with self._lock:
+            if self._image is None:
+                self._image = self._loader()
+        return self._image
+
+    def replace_image(self, image):
+        """Swap in an array with the same pixels, e.g. a memory-mapped copy that frees RAM."""
+        with self._lock:
+            # Arrays opened without a reduced decode use the full image as their preview too
+            if self.preview is self._image:
+                self.preview = image
+            self._image = image
+
+def _reduced_decode_flag(width, height, min_size):
+    """The smallest reduced decode whose long side is still at least min_size, or None."""
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if max(width, height) / factor >= min_size:
+            return flag
+    return None
+
+def _file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return ("file", os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+class ResultCache:
+    """Memoizes processor and render outputs under a byte budget, evicting least recently used.
+
+    Entries are keyed by the identity of the input image plus the operation applied to it.
+    Identities are content addresses: an output's identity is derived from its input's
+    identity and the operation, so results computed from results are found again no
+    matter which array object a caller holds. Arrays the cache has not seen get a fresh
+    identity unless one is registered, e.g. from the file they were decoded from.
+    """
+
+    def __init__(self, budget=RESULT_CACHE_BUDGET):
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._identities = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def register(self, image, identity):
+        with self._lock:
+            self._remember(image, identity)
+
+    def identity(self, image):
+        with self._lock:
+            known = self._identities.get(id(image))
+            if known is not None and known[0]() is image:
+                return known[1]
+            identity = ("array", next(self._counter))
+            self._remember(image, identity)
+            return identity
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            size = _entry_bytes(result)
+            if key not in self._entries and size <= self.budget:
+                self._entries[key] = result
+                self._bytes += size
+                while self._bytes > self.budget:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= _entry_bytes(evicted)
+            self._remember(result, key)
+        return result
+
+    def process(self, processor, image):
+        return self.get_or_compute((self.identity(image), processor.cache_key()), lambda: processor.process(image))
+
+    def render(self, plan, image, render=None):
+        render = render or plan.render
+        return self.get_or_compute((self.identity(image), plan.key), lambda: render(image))
+
+    def replace(self, image, replacement):
+        """Swap a cached array for one with the same pixels, e.g. its memory-mapped copy."""
+        with self._lock:
+            known = self._identities.get(id(image))
+            if known is not None and known[0]() is image:
+                self._remember(replacement, known[1])
+            for key, result in list(self._entries.items()):
+                if result is image:
+                    self._entries[key] = replacement
+                    self._bytes += _entry_bytes(replacement) - _entry_bytes(image)
+
+    def memory_usage(self):
+        return self._bytes
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remember(self, image, identity):
+        # Identities are looked up by id(), so drop them as soon as the array is collected
+        image_id = id(image)
+        self._identities[image_id] = (weakref.ref(image, lambda _: self._forget(image_id)), identity)
+
+    def _forget(self, image_id):
+        known = self._identities.get(image_id)
+        if known is not None and known[0]() is None:
+            del self._identities[image_id]
+
+def _entry_bytes(image):
+    # A view is charged its own pixels rather than the whole buffer it shares, e.g. a crop of
+    # an original the document already holds; pixels paged in from a memmap are not charged
+    return 0 if isinstance(_owning_array(image), np.memmap) else image.nbytes
+
+def render_plan(plan, source, large_image_bytes=LARGE_IMAGE_BYTES, tile_budget=TILE_BUDGET, executor=None):
+    if executor is not None:
+        return executor.render(plan, source, large_image_bytes)
+    if is_disk_backed(source) or source.nbytes > large_image_bytes:
+        return plan.render_tiled(source, tile_budget)
+    return plan.render(source)
+
+class TileExecutor:
+    """Runs renders and processors over horizontal strips of an image on a thread pool.
+
+    OpenCV and numpy release the GIL inside their loops, so the strips really run in
+    parallel. OpenCV also threads its own loops, so by default the pool takes only half the
+    cores rather than the two of them both trying to use every one.
+    """
+
+    def __init__(self, workers=None, strips_per_worker=4,
+                 min_parallel_bytes=MIN_PARALLEL_BYTES, tile_budget=TILE_BUDGET):
+        self.workers = workers or max(1, (os.cpu_count() or 1) // 2)
+        self.strips_per_worker = strips_per_worker
+        self.min_parallel_bytes = min_parallel_bytes
+        self.tile_budget = tile_budget
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def render(self, plan, source, large_image_bytes=LARGE_IMAGE_BYTES):
+        """Render a plan at full resolution, one output strip per task."""
+        out_width, out_height = plan.output_size
+        channels = () if plan.grayscale or source.ndim == 2 else source.shape[2:]
+        shape = (out_height, out_width) + channels
+        nbytes = int(np.prod(shape)) * source.itemsize
+        disk = is_disk_backed(source) or source.nbytes > large_image_bytes
+        at_full_size = source.shape[:2] == (plan.source_height, plan.source_width)
+        if self.workers == 1 or nbytes < self.min_parallel_bytes or not at_full_size:
+            return plan.render_tiled(source, self.tile_budget) if disk else plan.render(source)
+
+        output = create_disk_image(shape, source.dtype) if disk else np.empty(shape, source.dtype)
+
+        def render_strip(y1, y2):
+            strip_plan = copy.copy(plan)
+            strip_plan.crop_output(0, y1, out_width, y2)
+            output[y1:y2] = strip_plan.render(source)
+
+        self._run(render_strip, self._strips(out_height, nbytes // out_height))
+        if disk:
+            output.flush()
+        return output
+
+    def process(self, processor, image):
+        """Run a processor strip by strip, giving each strip halo rows of context on either side.
+
+        Processors without a halo change the geometry, so they are rendered through a plan.
+        """
+        if processor.halo is None:
+            return self.render(RenderPlan.from_processors(image, [processor]), image)
+        if self.workers == 1 or image.nbytes < self.min_parallel_bytes:
+            return processor.process(image)
+
+        height = image.shape[0]
+        halo = processor.halo
+
+        def process_strip(y1, y2):
+            top, bottom = max(0, y1 - halo), min(height, y2 + halo)
+            return processor.process(image[top:bottom])[y1 - top:y2 - top]
+
+        # The first strip tells the output's channels and dtype
+        strips = self._strips(height, image.nbytes // height)
+        first = process_strip(*strips[0])
+        shape = (height,) + first.shape[1:]
+        if is_disk_backed(image):
+            output = create_disk_image(shape, first.dtype)
+        else:
+            output = np.empty(shape, first.dtype)
+        output[:strips[0][1]] = first
+
+        def store_strip(y1, y2):
+            output[y1:y2] = process_strip(y1, y2)
+
+        self._run(store_strip, strips[1:])
+        return output
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _strips(self, height, row_bytes):
+        # Several strips per worker even out uneven strips; tile_budget bounds each one
+        rows = -(-height // (self.workers * self.strips_per_worker))
+        rows = max(1, min(rows, self.tile_budget // max(1, row_bytes)))
+        return [(y1, min(y1 + rows, height)) for y1 in range(0, height, rows)]
+
+    def _run(self, func, strips):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tile-worker")
+            pool = self._pool
+        futures = [pool.submit(func, *strip) for strip in strips]
+        for future in futures:
+            future.result()
+
+class EditHistory:
+    """Undo/redo as a log of processors, rendered lazily through a fused RenderPlan.
+
+    Edits only append to the log. Full-resolution pixels are produced by materialize(),
+    which starts from the nearest stored checkpoint, or from the ImageSource if there is
+    none, and keeps its result as a new one.
+    """
+
+    def __init__(self, source, memory_budget=HISTORY_MEMORY_BUDGET, cache=None, executor=None):
+        self.source = source
+        self.memory_budget = memory_budget
+        self.cache = cache
+        self.executor = executor
+        self._operations = []
+        self._position = 0
+        self._checkpoints = {}
+        # spill() swaps checkpoints from a worker thread while the Tk thread edits
+        self._lock = threading.Lock()
+
+    @classmethod
+    def restore(cls, source, operations, position, checkpoints, memory_budget=HISTORY_MEMORY_BUDGET,
+                cache=None, executor=None):
+        history = cls(source, memory_budget, cache, executor)
+        history._operations = list(operations)
+        history._position = position
+        history._checkpoints = dict(checkpoints)
+        return history
+
+    def state(self):
+        """All operations (including the redo tail), the current position and the checkpoints."""
+        with self._lock:
+            return list(self._operations), self._position, dict(self._checkpoints)
+
+    def __len__(self):
+        return self._position
+
+    def can_undo(self):
+        return self._position > 0
+
+    def can_redo(self):
+        return self._position < len(self._operations)
+
+    def operations(self):
+        return self._operations[:self._position]
+
+    def apply(self, processor):
+        plan = self.plan()
+        processor.fuse_into(plan)
+        with self._lock:
+            del self._operations[self._position:]
+            self._checkpoints = {i: c for i, c in self._checkpoints.items() if i <= self._position}
+            self._operations.append(processor)
+            self._position += 1
+
+    def undo(self):
+        if not self.can_undo():
+            raise Exception("Nothing to undo")
+        self._position -= 1
+
+    def redo(self):
+        if not self.can_redo():
+            raise Exception("Nothing to redo")
+        self._position += 1
+
+    def plan(self):
+        return RenderPlan.for_size(self.source.width, self.source.height, self.operations())
+
+    def materialize(self):
+        token, render = self.materialize_job()
+        image = render()
+        self.add_checkpoint(token, image)
+        return image
+
+    def materialize_job(self):
+        """Snapshot what materialize() needs, so the render can run off the Tk thread.
+
+        Returns a token for add_checkpoint() and a callable that does not touch the history.
+        """
+        start = max((i for i in self._checkpoints if i <= self._position), default=0)
+        checkpoint = self._checkpoints.get(start)
+        operations = self._operations[start:self._position]
+        token = tuple(self.operations())
+        source = self.source
+        cache = self.cache
+        executor = self.executor
+
+        def render():
+            if checkpoint is not None:
+                image = checkpoint
+            else:
+                image = source.load()
+                if cache is not None and source.identity is not None:
+                    cache.register(image, source.identity)
+            if not operations:
+                return image
+            plan = RenderPlan.from_processors(image, operations)
+            if cache is None:
+                return render_plan(plan, image, executor=executor)
+            return cache.render(plan, image, lambda image: render_plan(plan, image, executor=executor))
+
+        return token, render
+
+    def add_checkpoint(self, token, image):
+        # The token is the exact operation sequence rendered; edits made meanwhile may have replaced it
+        position = len(token)
+        with self._lock:
+            if position == 0 or tuple(self._operations[:position]) != token or position in self._checkpoints:
+                return
+            self._checkpoints[position] = image
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        # Every position stays reachable from the source, so any checkpoint may be evicted
+        while self._checkpoints and self.memory_usage() > self.memory_budget:
+            del self._checkpoints[min(self._checkpoints)]
+
+    def memory_usage(self):
+        """Bytes of RAM held by checkpoints, excluding the original and disk-backed arrays."""
+        original = _owning_array(self.source.image) if self.source.is_loaded else None
+        buffers = {}
+        for image in self._checkpoints.values():
+            owner = _owning_array(image)
+            if owner is not original and not isinstance(owner, np.memmap):
+                buffers[id(owner)] = owner.nbytes
+        return sum(buffers.values())
+
+    def spill(self, directory, tile_budget=TILE_BUDGET):
+        """Move the original and every checkpoint to memory-mapped files in directory.
+
+        The copy is taken from a snapshot, so this can run off the Tk thread; a checkpoint is
+        only swapped for its mapped copy if the history still holds it at the same index,
+        checked and swapped under the lock that apply() takes to truncate the redo branch.
+        """
+        state = self.state()
+        data = _write_session(directory, self.source, state, tile_budget)
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        def repoint_cache(image, mapped):
+            if self.cache is not None:
+                # The cache may hold the same result; point it at the mapped copy too
+                self.cache.replace(image, mapped)
+
+        original = self.source.image
+        mapped = load(data["files"]["original"])
+        repoint_cache(original, mapped)
+        self.source.replace_image(mapped)
+        checkpoints = state[2]
+        for index, name in data["checkpoints"].items():
+            image = checkpoints[int(index)]
+            mapped = load(name)
+            with self._lock:
+                swapped = self._checkpoints.get(int(index)) is image
+                if swapped:
+                    self._checkpoints[int(index)] = mapped
+            if swapped:
+                repoint_cache(image, mapped)
+
+def _owning_array(image):
+    # Crops are numpy views, so memory is attributed to the array that owns the buffer
+    while isinstance(image.base, np.ndarray):
+        image = image.base
+    return image
+
+def _ram_bytes(images):
+    """Bytes of RAM behind a set of arrays, counting shared buffers once and memmaps not at all."""
+    buffers = {}
+    for image in images:
+        if image is None:
+            continue
+        owner = _owning_array(image)
+        if not isinstance(owner, np.memmap):
+            buffers[id(owner)] = owner.nbytes
+    return sum(buffers.values())
+
+def save_session(directory, history, tile_budget=TILE_BUDGET):
+    """Write an editing session as JSON plus raw .npy arrays that reopen memory-mapped.
+
+    The original is stored decoded, so reopening never touches the compressed source file.
+    """
+    _write_session(directory, history.source, history.state(), tile_budget)
+
+def _write_session(directory, source, state, tile_budget):
+    os.makedirs(directory, exist_ok=True)
+    operations, position, checkpoints = state
+    files = {
+        "original": _save_session_array(directory, "original", source.load(), tile_budget),
+        "preview": _save_session_array(directory, "preview", source.preview, tile_budget),
+    }
+    checkpoint_files = {
+        str(index): _save_session_array(directory, f"checkpoint-{index}", image, tile_budget)
+        for index, image in checkpoints.items()
+    }
+    data = {
+        "version": SESSION_VERSION,
+        "source": {
+            "path": source.path,
+            "width": source.width,
+            "height": source.height,
+            "identity": list(source.identity) if source.identity else None,
+        },
+        "operations": [processor.to_dict() for processor in operations],
+        "position": position,
+        "files": files,
+        "checkpoints": checkpoint_files,
+    }
+    session_path = os.path.join(directory, SESSION_FILE)
+    with open(session_path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(session_path + ".tmp", session_path)
+
+    # Arrays of earlier saves go once the JSON no longer names them. Windows refuses to
+    # remove a file the live history still maps; that one is retried on the next save
+    referenced = set(files.values()) | set(checkpoint_files.values())
+    for name in os.listdir(directory):
+        if name.startswith(SESSION_ARRAY_PREFIXES) and name.endswith(".npy") and name not in referenced:
+            _remove_quietly(os.path.join(directory, name))
+    return data
+
+def _save_session_array(directory, prefix, image, tile_budget):
+    owner = _owning_array(image)
+    if isinstance(owner, np.memmap) and owner is image \
+            and os.path.dirname(owner.filename) == os.path.abspath(directory):
+        return os.path.basename(owner.filename)
+
+    # Always a new file: an earlier save's file may still be mapped, and replacing a mapped
+    # file fails on Windows
+    handle, path = tempfile.mkstemp(prefix=prefix + "-", suffix=".npy", dir=directory)
+    os.close(handle)
+    output = np.lib.format.open_memmap(path, mode="w+", dtype=image.dtype, shape=image.shape)
+    for y1, y2 in _row_strips(image, tile_budget):
+        output[y1:y2] = image[y1:y2]
+    output.flush()
+    del output
+    return os.path.basename(path)
+
+def load_session(directory, memory_budget=HISTORY_MEMORY_BUDGET, cache=None, executor=None):
+    """Reopen a saved session. Arrays are memory-mapped, so this costs almost nothing up front."""
+    if os.path.basename(directory) == SESSION_FILE:
+        directory = os.path.dirname(directory)
+    with open(os.path.join(directory, SESSION_FILE)) as f:
+        data = json.load(f)
+    if data.get("version") != SESSION_VERSION:
+        raise Exception(f"Unsupported session version: {data.get('version')}")
+
+    def open_array(name):
+        return np.load(os.path.join(directory, name), mmap_mode="r")
+
+    info = data["source"]
+    source = ImageSource(info["width"], info["height"], open_array(data["files"]["preview"]),
+                         image=open_array(data["files"]["original"]), path=info["path"])
+    source.identity = tuple(info["identity"]) if info.get("identity") else None
+    operations = [processor_from_dict(item) for item in data["operations"]]
+    checkpoints = {int(index): open_array(name) for index, name in data["checkpoints"].items()}
+    return EditHistory.restore(source, operations, data["position"], checkpoints, memory_budget, cache, executor)
+
+class Document:
+    """One image open in a Workspace: its edit history and preview pyramid."""
+
+    def __init__(self, path, history, pyramid):
+        self.path = path
+        self.history = history
+        self.pyramid = pyramid
+        self.last_viewed = 0
+        self.spill_directory = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.history.source.path or self.path)
+
+    @property
+    def source(self):
+        return self.history.source
+
+    def memory_usage(self):
+        """Bytes of RAM held by the original, its preview levels and the history checkpoints."""
+        return _ram_bytes(self._arrays() + self.pyramid.levels)
+
+    def spill(self, directory, tile_budget=TILE_BUDGET):
+        """Move the full-resolution arrays to memory-mapped files, including the pyramid's base
+        when it is the original itself."""
+        original = self.source.image
+        self.history.spill(directory, tile_budget)
+        if self.pyramid.levels[0] is original:
+            self.pyramid.rebase(self.source.image)
+
+    def spillable_bytes(self):
+        # Only the full-resolution arrays are worth moving; previews are small and always on screen
+        return _ram_bytes(self._arrays()) if self.source.is_loaded else 0
+
+    def _arrays(self):
+        return [self.source.image] + list(self.history.state()[2].values())
+
+class Workspace:
+    """Several open images sharing one RAM budget.
+
+    Images are keyed by path, so reopening one that is already open is a lookup rather
+    than a decode. When the documents together hold more than memory_budget bytes, the
+    least recently viewed ones are spilled: their full-resolution original and checkpoints
+    move to memory-mapped files in a temporary directory and are paged back in on demand.
+    """
+
+    def __init__(self, memory_budget=WORKSPACE_MEMORY_BUDGET, tile_budget=TILE_BUDGET):
+        self.memory_budget = memory_budget
+        self.tile_budget = tile_budget
+        self._documents = {}
+        self._clock = itertools.count(1)
+        self._directory = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._documents
+
+    def documents(self):
+        """Open documents in the order they were opened."""
+        with self._lock:
+            return list(self._documents.values())
+
+    def add(self, path, history, pyramid):
+        document = Document(os.path.abspath(path), history, pyramid)
+        with self._lock:
+            replaced = self._documents.pop(document.path, None)
+            self._documents[document.path] = document
+            document.last_viewed = next(self._clock)
+        if replaced is not None:
+            self._remove_spill(replaced)
+        return document
+
+    def view(self, path):
+        """Return the document for path and mark it as the most recently viewed."""
+        with self._lock:
+            document = self._documents[os.path.abspath(path)]
+            document.last_viewed = next(self._clock)
+        return document
+
+    def close(self, path):
+        with self._lock:
+            document = self._documents.pop(os.path.abspath(path))
+        self._remove_spill(document)
+        return document
+
+    def most_recent(self):
+        with self._lock:
+            return max(self._documents.values(), key=lambda document: document.last_viewed, default=None)
+
+    def memory_usage(self):
+        return sum(document.memory_usage() for document in self.documents())
+
+    def enforce_budget(self, keep=None):
+        """Spill least recently viewed documents until the workspace fits its budget.
+
+        keep, normally the document on screen, is only spilled if nothing else is left.
+        Returns the spilled documents.
+        """
+        keep = os.path.abspath(keep) if keep else None
+        spilled = []
+        with self._spill_lock:
+            documents = sorted(self.documents(), key=lambda document: (document.path == keep, document.last_viewed))
+            for document in documents:
+                if self.memory_usage() <= self.memory_budget:
+                    break
+                if document.spillable_bytes() and document.path in self._documents:
+                    document.spill(self._spill_directory(document), self.tile_budget)
+                    spilled.append(document)
+        return spilled
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            directory, self._directory = self._directory, None
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _spill_directory(self, document):
+        if document.spill_directory is None:
+            with self._lock:
+                if self._directory is None:
+                    self._directory = tempfile.mkdtemp(prefix="image-editor-workspace-")
+                    atexit.register(shutil.rmtree, self._directory, True)
+                document.spill_directory = os.path.join(self._directory, f"{next(self._clock)}.session")
+        return document.spill_directory
+
+    def _remove_spill(self, document):
+        # Arrays already mapped from these files stay readable on POSIX after removal
+        if document.spill_directory is not None:
+            shutil.rmtree(document.spill_directory, ignore_errors=True)
+
+def thumbnail_cache_root():
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "image-editor", "thumbnails")
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """A BGR thumbnail fitting in size x size, from the smallest reduced decode that covers it."""
+    try:
+        flag = _reduced_decode_flag(*read_image_size(path), size)
+    except Exception:
+        flag = None
+    image = cv2.imread(path, flag if flag is not None else cv2.IMREAD_COLOR)
+    if image is None:
+        raise Exception("Failed to load image")
+    height, width = image.shape[:2]
+    scale = min(size / width, size / height, 1)
+    thumbnail_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, thumbnail_size, interpolation=cv2.INTER_AREA)
+
+class ThumbnailIndex:
+    """Persistent thumbnails of the images in one folder.
+
+    Thumbnails are stored raw in fixed-size slots of one memory-mapped .npy file, with
+    a JSON index mapping each file name to its slot. An entry is valid while the file's
+    mtime and size are unchanged, so reopening a folder decodes nothing, and get() only
+    pages in the slots that are actually shown. put() may be called from many threads.
+    """
+
+    def __init__(self, folder, cache_root=None, size=THUMBNAIL_SIZE):
+        self.folder = os.path.abspath(folder)
+        self.size = size
+        digest = hashlib.sha1(self.folder.encode("utf-8")).hexdigest()[:16]
+        self.directory = os.path.join(cache_root or thumbnail_cache_root(), digest)
+        self._lock = threading.Lock()
+        self._files = self._scan()
+        self.paths = [os.path.join(self.folder, name) for name in sorted(self._files, key=str.lower)]
+        self._entries = {}
+        self._thumbnails = None
+        self._thumbnails_file = None
+        self._free = []
+        self._load()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get(self, path):
+        """The stored thumbnail for path, or None if it is missing or out of date."""
+        name = os.path.basename(path)
+        with self._lock:
+            if not self._is_current(name) or self._entries[name][2] < 0:
+                return None
+            _, _, slot, width, height = self._entries[name]
+            return self._thumbnails[slot, :height, :width]
+
+    def missing(self):
+        """Paths with no up-to-date entry; files that failed to decode are not retried until they change."""
+        with self._lock:
+            return [path for path in self.paths if not self._is_current(os.path.basename(path))]
+
+    def put(self, path, thumbnail):
+        name = os.path.basename(path)
+        height, width = thumbnail.shape[:2]
+        with self._lock:
+            entry = self._entries.get(name)
+            slot = entry[2] if entry is not None and entry[2] >= 0 else self._allocate()
+            self._thumbnails[slot, :height, :width] = thumbnail
+            self._entries[name] = list(self._files[name]) + [slot, width, height]
+
+    def put_failed(self, path):
+        name = os.path.basename(path)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[2] >= 0:
+                self._free.append(entry[2])
+            self._entries[name] = list(self._files[name]) + [-1, 0, 0]
+
+    def save(self):
+        with self._lock:
+            if self._thumbnails is not None:
+                self._thumbnails.flush()
+            data = {"version": THUMBNAIL_INDEX_VERSION, "folder": self.folder, "size": self.size,
+                    "thumbnails": self._thumbnails_file, "entries": self._entries}
+            path = os.path.join(self.directory, THUMBNAIL_INDEX_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(path + ".tmp", path)
+            # Files left by growing; on Windows one still mapped by a shown thumbnail waits for a later save
+            for name in os.listdir(self.directory):
+                if name.startswith("thumbnails") and name.endswith(".npy") and name != self._thumbnails_file:
+                    _remove_quietly(os.path.join(self.directory, name))
+
+    def _is_current(self, name):
+        entry = self._entries.get(name)
+        return entry is not None and name in self._files and (entry[0], entry[1]) == self._files[name]
+
+    def _scan(self):
+        files = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(os.path.join(self.directory, THUMBNAIL_INDEX_FILE)) as f:
+                data = json.load(f)
+            if data.get("version") != THUMBNAIL_INDEX_VERSION or data.get("size") != self.size:
+                raise ValueError("Thumbnail index is out of date")
+            thumbnails = np.load(os.path.join(self.directory, data["thumbnails"]), mmap_mode="r+")
+            if thumbnails.shape[1:] != (self.size, self.size, 3):
+                raise ValueError("Thumbnail index is out of date")
+        except (OSError, ValueError, KeyError, TypeError):
+            self._grow(max(16, len(self._files)))
+            return
+
+        # Entries of deleted files are dropped and their slots reused
+        self._entries = {name: entry for name, entry in data["entries"].items() if name in self._files}
+        self._thumbnails = thumbnails
+        self._thumbnails_file = data["thumbnails"]
+        used = {entry[2] for entry in self._entries.values()}
+        self._free = [slot for slot in range(len(thumbnails) - 1, -1, -1) if slot not in used]
+        if len(self._files) > len(thumbnails):
+            self._grow(len(self._files))
+
+    def _allocate(self):
+        if not self._free:
+            self._grow(2 * len(self._thumbnails))
+        return self._free.pop()
+
+    def _grow(self, capacity):
+        # Grown into a new file rather than replacing the old one, which is still mapped and may
+        # back thumbnails handed out by get(); Windows cannot replace a mapped file
+        handle, path = tempfile.mkstemp(prefix="thumbnails-", suffix=".npy", dir=self.directory)
+        os.close(handle)
+        thumbnails = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8,
+                                               shape=(capacity, self.size, self.size, 3))
+        old = 0 if self._thumbnails is None else len(self._thumbnails)
+        if old:
+            thumbnails[:old] = self._thumbnails
+        thumbnails.flush()
+        self._thumbnails = thumbnails
+        self._thumbnails_file = os.path.basename(path)
+        self._free = list(range(capacity - 1, old - 1, -1)) + self._free
+
+def generate_thumbnails(index, paths, workers=None, stop=None, save_every=200):
+    """Create the thumbnails for paths on a thread pool and store them in index.
+
+    Each image gets a reduced decode on its own thread; OpenCV releases the GIL while
+    decoding. Progress is saved every save_every images, so an interrupted run is not
+    lost. Setting the stop event skips the images not started yet. Returns the count made.
+    """
+    def make(path):
+        if stop is not None and stop.is_set():
+            return False
+        try:
+            index.put(path, make_thumbnail(path, index.size))
+        except Exception:
+            index.put_failed(path)
+        return True
+
+    # OpenCV's thread count is process-wide, so it is left alone: a save or render started
+    # meanwhile keeps all of its threads. Half the cores by default leaves room for them
+    workers = workers or max(1, (os.cpu_count() or 1) // 2)
+    made = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail-worker") as pool:
+        for done in pool.map(make, paths):
+            made += done
+            if done and made % save_every == 0:
+                index.save()
+    index.save()
+    return made
@@ -0,0 +1,116 @@
+"""
+Group Name: CAS/DAN GROUP-15
+Group Members:
+- S388343 Princy Patel
+- S390060 Lamia Sarwar 
+- S389242 Mahesh Chandra Regmi
+- S390909 Gallage Achintha Methsara Fernando
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Only the peak is available here, which still shows growth between spans
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return None
+
+def describe_array(image):
+    if image is None:
+        return {}
+    return {"shape": list(image.shape), "dtype": str(image.dtype), "bytes": int(image.nbytes)}
+
+class Tracer:
+    """Records timed spans of editor work and exports them as a Chrome/Perfetto trace.
+
+    Spans may be recorded from any thread. Each one carries its duration, the RSS change
+    across it and whatever details the caller attaches, such as array shapes.
+    """
+
+    def __init__(self, max_events=20000):
+        self._events = deque(maxlen=max_events)
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, category="editor", **details):
+        """Time the enclosed block; the yielded dict can be filled with details after the work."""
+        rss_before = current_rss()
+        start = time.perf_counter()
+        try:
+            yield details
+        finally:
+            end = time.perf_counter()
+            rss_after = current_rss()
+            if rss_before is not None and rss_after is not None:
+                details["rss_bytes"] = rss_after
+                details["rss_delta_bytes"] = rss_after - rss_before
+            thread = threading.current_thread()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": details,
+            }
+            with self._lock:
+                self._events.append(event)
+                self._thread_names[thread.ident] = thread.name
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def last(self):
+        with self._lock:
+            return self._events[-1] if self._events else None
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def export_chrome_trace(self, path):
+        """Write the recorded spans in the Trace Event format read by chrome://tracing and Perfetto."""
+        with self._lock:
+            events = list(self._events)
+            names = dict(self._thread_names)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in names.items()
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+def format_span(event):
+    """One-line status-bar text for a recorded span."""
+    text = f"{event['name']}: {event['dur'] / 1000:.1f} ms"
+    delta = event["args"].get("rss_delta_bytes")
+    if delta:
+        text += f", {delta / 1024 ** 2:+.1f} MB"
+    shape = event["args"].get("shape")
+    if shape:
+        text += f", {'x'.join(str(v) for v in shape)}"
+    return text
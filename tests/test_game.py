@@ -0,0 +1,176 @@
+import os
+import random
+
+# Run without a window; set before pygame is imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import pytest
+
+import game
+from game import COLLISION_CELL_SIZE, Boss, EntityGroup, MotionEngine, Player, Projectile, SpatialHash, SpritePool
+from game_benchmark import HeldKeys
+
+class Dot(pygame.sprite.Sprite):
+    def reset(self, *args):
+        self.args = args
+
+@pytest.fixture
+def headless_game(monkeypatch):
+    # Asset paths are relative to the repository root
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    yield game.Game
+    pygame.quit()
+
+def _recording_group():
+    group = EntityGroup()
+    calls = []
+    group.on_add.append(lambda sprite: calls.append(("add", sprite)))
+    group.on_remove.append(lambda sprite: calls.append(("remove", sprite)))
+    return group, calls
+
+def test_hooks_run_once_per_change():
+    group, calls = _recording_group()
+    other = EntityGroup()
+    dot = Dot()
+
+    group.add(dot)
+    group.add(dot)
+    assert calls == [("add", dot)]
+
+    group.remove(dot)
+    group.remove(dot)
+    assert calls == [("add", dot), ("remove", dot)]
+
+    calls.clear()
+    dot.add(group, other)
+    dot.kill()
+    dot.kill()
+    assert calls == [("add", dot), ("remove", dot)]
+    assert len(group) == len(other) == 0
+
+def _random_rect(rng, largest):
+    return pygame.Rect(rng.randint(-50, 850), rng.randint(-50, 650), rng.randint(1, largest), rng.randint(1, largest))
+
+def test_grid_queries_match_pairwise_checks():
+    rng = random.Random(0)
+    sprites = []
+    for _ in range(500):
+        sprite = Dot()
+        sprite.rect = _random_rect(rng, 150)
+        sprites.append(sprite)
+    # Some straddle a cell corner, so they overlap rects centred in the neighbouring cells
+    for x, y in ((COLLISION_CELL_SIZE, COLLISION_CELL_SIZE), (3 * COLLISION_CELL_SIZE, 2 * COLLISION_CELL_SIZE)):
+        sprite = Dot()
+        sprite.rect = pygame.Rect(0, 0, 40, 40)
+        sprite.rect.center = (x, y)
+        sprites.append(sprite)
+    grid = SpatialHash()
+    grid.rebuild(sprites)
+
+    for removed in sprites[::5]:
+        grid.remove(removed)
+    remaining = [sprite for i, sprite in enumerate(sprites) if i % 5]
+    queries = [_random_rect(rng, 200) for _ in range(300)] + [pygame.Rect(x - 2, y - 2, 4, 4)
+                                                              for x in range(0, 800, COLLISION_CELL_SIZE)
+                                                              for y in range(0, 600, COLLISION_CELL_SIZE)]
+    for rect in queries:
+        expected = {sprite for sprite in remaining if sprite.rect.colliderect(rect)}
+        hits = grid.query(rect)
+        assert len(hits) == len(expected) and set(hits) == expected
+
+def test_a_growing_pool_allocates_when_empty():
+    pool = SpritePool(Dot, 1)
+    first, second = pool.acquire(1), pool.acquire(2)
+
+    assert first is not second and second.args == (2,)
+    assert pool.stats()["allocated"] == 2 and pool.stats()["live"] == 2
+
+def test_a_dropping_pool_hands_out_nothing_when_empty():
+    pool = SpritePool(Dot, 1, overflow='drop')
+    first = pool.acquire()
+
+    assert pool.acquire() is None
+    assert pool.stats()["dropped"] == 1
+    pool.release(first)
+    assert pool.acquire() is first
+
+def test_a_recycling_pool_kills_and_reuses_the_oldest_sprite():
+    pool = SpritePool(Dot, 2, overflow='recycle')
+    group, calls = _recording_group()
+    group.on_remove.append(pool.release)
+    oldest, newer = pool.acquire(1), pool.acquire(2)
+    group.add(oldest, newer)
+
+    reused = pool.acquire(3)
+    assert reused is oldest and reused.args == (3,)
+    assert not group.has(oldest) and group.has(newer)
+    assert pool.stats()["recycled"] == 1 and pool.stats()["allocated"] == 2
+
+def test_releasing_twice_frees_a_sprite_once():
+    pool = SpritePool(Dot, 1)
+    sprite = pool.acquire()
+    pool.release(sprite)
+    pool.release(sprite)
+    pool.release(Dot())
+
+    assert pool.stats()["free"] == 1 and pool.stats()["live"] == 0
+    assert pool.acquire() is sprite
+    assert pool.acquire() is not sprite
+
+def test_an_unknown_overflow_policy_is_refused():
+    with pytest.raises(ValueError):
+        SpritePool(Dot, 1, overflow='evict')
+
+def _assert_engine_tracks_live_movers(g):
+    engine = g.motion
+    assert engine.count == len(engine._sprites)
+    assert all(sprite.slot == i for i, sprite in enumerate(engine._sprites))
+    assert set(engine._sprites) == set(g.enemies) | set(g.projectiles) | set(g.enemy_projectiles)
+
+def test_engine_slots_follow_kills_recycling_and_resets(headless_game, monkeypatch):
+    random.seed(0)
+    g = headless_game(vectorized=True)
+    # A small recycling pool, so holding fire reuses shots that are still tracked
+    g.projectile_pool = SpritePool(lambda: Projectile(0, 0, 0, 0), 8, overflow='recycle')
+    g.reset_game()
+    g.game_started = True
+    g.player.max_hp = g.player.hp = 10 ** 9
+    monkeypatch.setattr(pygame.key, "get_pressed", lambda: HeldKeys(pygame.K_SPACE))
+
+    for frame in range(300):
+        if frame % 3 == 0:
+            enemy = game.Enemy()
+            enemy.rect.center = (random.randint(0, game.SCREEN_WIDTH), random.randint(0, game.SCREEN_HEIGHT))
+            g.spawn(enemy, g.enemies)
+            g.fire((*enemy.rect.center, *g.player.rect.center), g.enemy_projectiles, g.enemy_projectile_pool)
+        if frame % 7 == 0 and g.enemies:
+            random.choice(g.enemies.sprites()).kill()
+        g._update_game_state()
+        _assert_engine_tracks_live_movers(g)
+    assert g.projectile_pool.recycled > 0
+
+    tracked = list(g.motion._sprites)
+    g.reset_game()
+    assert g.motion.count == 0 and all(sprite.slot is None for sprite in tracked)
+    _assert_engine_tracks_live_movers(g)
+
+def test_slow_diagonal_movement_is_not_truncated_on_either_path(headless_game):
+    headless_game()
+    player = Player()
+    player.rect.center = (700, 500)
+    scalar, vectorized = Boss(), Boss()
+    scalar.rect.center = vectorized.rect.center = (100, 100)
+    engine = MotionEngine()
+    engine.add_chaser(vectorized)
+
+    for _ in range(100):
+        scalar._move_towards_player(player)
+        engine.step(0, player.rect.center)
+
+    # Speed 1.5 for 100 frames along the diagonal, less at most the rounding of the rect
+    travelled = pygame.math.Vector2(scalar.rect.center).distance_to((100, 100))
+    assert travelled == pytest.approx(150, abs=1)
+    assert scalar.rect.center == vectorized.rect.center
+    assert scalar.image is vectorized.image
@@ -0,0 +1,20 @@
+import numpy as np
+
+from image_processing import _halve
+
+def test_halving_in_strips_matches_halving_whole():
+    rng = np.random.default_rng(0)
+    for height in (101, 102, 3, 5):
+        image = rng.integers(0, 256, (height, 63, 3), dtype=np.uint8)
+        whole = _halve(image, tile_budget=image.nbytes)
+        strips = _halve(image, tile_budget=image.nbytes // 10)
+
+        assert whole.shape == (height // 2, 31, 3)
+        assert np.array_equal(strips, whole)
+
+def test_an_odd_last_row_is_averaged_in():
+    image = np.zeros((101, 64, 3), dtype=np.uint8)
+    image[-1] = 255
+    for tile_budget in (image.nbytes, image.nbytes // 10):
+        level = _halve(image, tile_budget)
+        assert level[-1].min() > 0 and level[:-1].max() == 0
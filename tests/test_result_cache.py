@@ -0,0 +1,15 @@
+import numpy as np
+
+from image_processing import CropProcessor, ResultCache
+
+def test_crop_views_are_charged_their_own_bytes():
+    original = np.zeros((4000, 4000, 3), dtype=np.uint8)  # 48 MB, held by the document
+    cache = ResultCache(budget=64_000_000)
+    crops = [CropProcessor(0, 0, 10, 10, 1.0), CropProcessor(10, 10, 20, 20, 1.0)]
+    results = [cache.process(crop, original) for crop in crops]
+
+    assert all(result.base is original for result in results)
+    assert cache.stats()["entries"] == 2
+    assert cache.memory_usage() == sum(result.nbytes for result in results) == 600
+    assert cache.process(crops[0], original) is results[0]
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,60 @@
+import json
+import os
+
+import numpy as np
+
+import image_processing
+from image_processing import (EditHistory, GrayscaleProcessor, ImageSource, RotateProcessor, SESSION_FILE,
+                              load_session, save_session)
+
+def test_resaving_a_reopened_session_never_replaces_its_mapped_arrays(tmp_path, monkeypatch):
+    replace = os.replace
+
+    def refuse_npy(source, destination):
+        # Windows cannot replace a file that is memory-mapped
+        if str(destination).endswith(".npy"):
+            raise PermissionError(destination)
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", refuse_npy)
+    image = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    history = EditHistory(ImageSource.from_array(image))
+    history.apply(RotateProcessor())
+    history.materialize()
+    save_session(str(tmp_path), history)
+
+    reopened = load_session(str(tmp_path))
+    original_file = reopened.source.image.filename
+    reopened.undo()
+    reopened.apply(GrayscaleProcessor())
+    expected = reopened.materialize().copy()
+    save_session(str(tmp_path), reopened)
+
+    with open(tmp_path / SESSION_FILE) as f:
+        data = json.load(f)
+    referenced = set(data["files"].values()) | set(data["checkpoints"].values())
+    assert os.path.basename(original_file) == data["files"]["original"]
+    assert {name for name in os.listdir(tmp_path) if name.endswith(".npy")} == referenced
+    again = load_session(str(tmp_path))
+    assert np.array_equal(again.source.image, image)
+    assert np.array_equal(again.materialize(), expected)
+
+def test_spilling_never_brings_back_a_checkpoint_of_a_truncated_branch(tmp_path, monkeypatch):
+    image = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    history = EditHistory(ImageSource.from_array(image))
+    history.apply(RotateProcessor())
+    history.materialize()
+    history.undo()
+    write_session = image_processing._write_session
+
+    def edit_meanwhile(*args):
+        # The Tk thread starts a new branch while the worker writes the arrays
+        data = write_session(*args)
+        history.apply(GrayscaleProcessor())
+        return data
+
+    monkeypatch.setattr(image_processing, "_write_session", edit_meanwhile)
+    history.spill(str(tmp_path))
+
+    assert history.state()[2] == {}
+    assert np.array_equal(history.materialize(), GrayscaleProcessor().process(image))
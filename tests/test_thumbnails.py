@@ -0,0 +1,41 @@
+import os
+
+import cv2
+import numpy as np
+
+from image_processing import ThumbnailIndex, generate_thumbnails
+
+def _write_images(folder, start, count):
+    for i in range(start, start + count):
+        cv2.imwrite(str(folder / f"img{i:03d}.png"), np.full((40, 60, 3), i, dtype=np.uint8))
+
+def test_growing_the_index_never_replaces_the_mapped_file(tmp_path, monkeypatch):
+    replace = os.replace
+
+    def refuse_npy(source, destination):
+        # Windows cannot replace a file that is memory-mapped
+        if str(destination).endswith(".npy"):
+            raise PermissionError(destination)
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", refuse_npy)
+    folder = tmp_path / "photos"
+    folder.mkdir()
+    cache = tmp_path / "cache"
+    _write_images(folder, 0, 3)
+    first = ThumbnailIndex(str(folder), str(cache))
+    generate_thumbnails(first, first.paths, workers=2)
+    shown = first.get(first.paths[0])
+
+    # More images than slots, so reopening grows the thumbnail file while the first index maps it
+    _write_images(folder, 3, 30)
+    second = ThumbnailIndex(str(folder), str(cache))
+    assert np.array_equal(second.get(second.paths[0]), shown)
+    assert second.missing() == second.paths[3:]
+    generate_thumbnails(second, second.missing(), workers=2)
+
+    files = [name for name in os.listdir(second.directory) if name.endswith(".npy")]
+    assert len(files) == 1
+    third = ThumbnailIndex(str(folder), str(cache))
+    assert third.missing() == []
+    assert third.get(third.paths[32])[0, 0].tolist() == [32, 32, 32]
@@ -0,0 +1,21 @@
+import numpy as np
+
+from image_processing import EditHistory, GrayscaleProcessor, ImageSource, PreviewPyramid, Workspace
+
+def test_spilling_an_array_opened_without_a_reduced_preview_frees_it():
+    image = np.random.default_rng(0).integers(0, 256, (1000, 1500, 3), dtype=np.uint8)
+    source = ImageSource.from_array(image)
+    history = EditHistory(source)
+    history.apply(GrayscaleProcessor())
+    workspace = Workspace(memory_budget=1)
+    try:
+        document = workspace.add("image.npy", history, PreviewPyramid(source.preview))
+        workspace.enforce_budget()
+
+        assert isinstance(source.image, np.memmap)
+        assert source.preview is source.image
+        assert document.pyramid.levels[0] is source.image
+        assert document.memory_usage() == sum(level.nbytes for level in document.pyramid.levels[1:])
+        assert np.array_equal(document.pyramid.levels[0], image)
+    finally:
+        workspace.clear()